@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
 import html2text
 from bs4 import BeautifulSoup
 import base64
 from datetime import datetime, timedelta
+from http_client import get_client, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
 
 # Classe para gerenciar cada projeto
 class Project:
@@ -16,6 +16,8 @@ class Project:
         self.ignore_links = True
         self.ignore_images = True
         self.log = []
+        self.connect_timeout = DEFAULT_CONNECT_TIMEOUT
+        self.read_timeout = DEFAULT_READ_TIMEOUT
 
 def remove_duplicates_and_log(urls, project):
     unique_urls = []
@@ -34,7 +36,7 @@ def remove_duplicates_and_log(urls, project):
 def html_to_markdown(url, tags, ignore_links, ignore_images, project):
     log_entry = {"url": url, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
     try:
-        response = requests.get(url)
+        response = get_client(project.connect_timeout, project.read_timeout).get(url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -157,6 +159,9 @@ def main():
             session_state.current_project.name = new_name
             st.experimental_rerun()
 
+        session_state.current_project.connect_timeout = st.number_input("Connect timeout (seconds)", min_value=1.0, max_value=120.0, value=float(session_state.current_project.connect_timeout))
+        session_state.current_project.read_timeout = st.number_input("Read timeout (seconds)", min_value=1.0, max_value=600.0, value=float(session_state.current_project.read_timeout))
+
         if st.button("Delete Project"):
             session_state.projects = [project for project in session_state.projects if project != session_state.current_project]
             session_state.current_project = session_state.projects[0] if session_state.projects else None
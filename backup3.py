@@ -1,112 +1,182 @@
 import streamlit as st
-import requests
-import html2text
-from bs4 import BeautifulSoup
-import base64
-from datetime import datetime, timedelta
-import re
-
-# Classe para gerenciar cada projeto
-class Project:
-    def __init__(self, name):
-        self.name = name
-        self.urls = ""
-        self.selected_tags = ['article']
-        self.markdown_output = ""
-        self.file_name = 'md-export.md'
-        self.ignore_links = True
-        self.ignore_images = True
-        self.log = []
+import time
+from fetcher import fetch_concurrently, available_cores
+from http_client import SkippedResponse
+from response_cache import get_cache
+from extraction import available_parsers, EXTRACTION_MODES
+from pipeline import Project, fetch_markdown, project_client, project_cache, project_pool, project_politeness, conversion_options, result_status, iter_output, near_duplicate_entry
+from substitution import url_spans, substitute_urls
+from export import MarkdownSpool, PREVIEW_CHARS
+from metrics import new_metrics
+from log_view import show_log, show_cache_stats
+from job_view import show_job_progress
+from jobs import start_job, get_job, forget_job
+from store import get_store, owner_key
+from canonical import dedupe_urls
+from boilerplate import ContentDeduper, NEAR_DUPLICATE_MODES
+from profiles import match_profile, profile_selectors
+from profile_view import show_profiles
+from compact import session_nbytes
 
+# Returns (unique_urls, aliases) as canonical.dedupe_urls does
 def remove_duplicates_and_log(urls, project):
-    unique_urls = []
-    for url in urls:
-        if url not in unique_urls:
-            unique_urls.append(url)
-        else:
-            log_entry = {
-                "url": url, 
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-                "status": "Removed Duplicate"
-            }
-            project.log.append(log_entry)
-    return unique_urls
-
-def html_to_markdown(url, tags, ignore_links, ignore_images, project):
-    log_entry = {"url": url, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        content = ""
-        for tag in tags:
-            for element in soup.find_all(tag):
-                content += str(element)
-
-        if not content:
-            raise ValueError("No specified tags found in the HTML.")
+    def log_collapse(url, kept, reason):
+        log_entry = {
+            "url": url, 
+            "time": time.time(), 
+            "status": "Removed Duplicate" if reason == "duplicate" else f"Removed Duplicate of {kept} ({reason})"
+        }
+        project.log.append(log_entry)
+    return dedupe_urls(urls, log_collapse)
 
-        markdown_converter = html2text.HTML2Text()
-        markdown_converter.ignore_links = ignore_links
-        markdown_converter.ignore_images = ignore_images
-        markdown_text = markdown_converter.handle(content)
+def html_to_markdown(url, tags, ignore_links, ignore_images, project, queued=None, store=None, politeness=None, pool=None):
+    log_entry = {"url": url, "time": time.time()}
+    metrics = new_metrics()
+    if queued is not None:
+        metrics["queue_wait"] = time.perf_counter() - queued
+    try:
+        markdown_text = fetch_markdown(url, tags, ignore_links, ignore_images, project_client(project), project_cache(project),
+                                       project.extraction_mode, project.parser, project.use_strainer, pool, metrics,
+                                       project.max_download_bytes, project.html_only, politeness,
+                                       profile_selectors(match_profile(url, project.profiles)))
 
         log_entry["status"] = "OK"
-        project.log.append(log_entry)
-        return markdown_text
+    except SkippedResponse as e:
+        log_entry["status"] = f"Skipped: {e}"
+        markdown_text = ""
     except Exception as e:
         log_entry["status"] = f"Error: {e}"
-        project.log.append(log_entry)
-        return ""
+        markdown_text = ""
+    log_entry.update(metrics)
+    project.log.append(log_entry)
+    if store is not None:
+        store.record_result(project.id, url, result_status(log_entry["status"]), markdown_text)
+        store.append_log(project.id, log_entry)
+    return markdown_text
 
-def process_urls(urls, project):
-    combined_markdown = ""
-    for url in urls:
-        combined_markdown += html_to_markdown(url, project.selected_tags, project.ignore_links, project.ignore_images, project) + "\n\n"
-    return combined_markdown
+def convert_urls(urls, project, on_result=None, cancel=None, store=None):
+    queued = time.perf_counter()
+    politeness = project_politeness(project, len(urls))
+    pool = project_pool(project)
 
-def download_markdown(markdown_text, filename):
-    b64 = base64.b64encode(markdown_text.encode()).decode()
-    href = f'<a href="data:file/markdown;base64,{b64}" download="{filename}" target="_blank">Click here to download your markdown file</a>'
-    return href
+    def convert(url):
+        markdown_text = html_to_markdown(url, project.selected_tags, project.ignore_links, project.ignore_images, project, queued, store, politeness, pool)
+        # With a store the result is read back from it rather than kept twice
+        return markdown_text + "\n\n" if store is None else None
+    return fetch_concurrently(urls, convert, project.max_workers, project.max_per_host, on_result, keep_results=store is None, cancel=cancel,
+                              scheduler=politeness)
 
 def clear_project_data(project):
     project.urls = ""
     project.selected_tags = ['article']
     project.markdown_output = ""
-    project.log = []
-
-def estimate_time_left(start_time, current_progress, total):
-    if current_progress == 0:
-        return "Estimating..."
-    elapsed_time = datetime.now() - start_time
-    total_time = elapsed_time.total_seconds() / current_progress
-    remaining_time = total_time * (1 - current_progress)
-    remaining_time_delta = timedelta(seconds=round(remaining_time))
-    if remaining_time_delta.total_seconds() < 3600:
-        return f"{remaining_time_delta.seconds // 60} min {remaining_time_delta.seconds % 60} sec"
+    project.log.clear()
+    if project.output_spool is not None:
+        project.output_spool.close()
+        project.output_spool = None
+    get_store().set_urls(project.id, {})
+    get_store().clear_log(project.id)
+
+def show_spooled_output(project):
+    spool = project.output_spool
+    st.markdown("## Markdown Output")
+    st.text_area("Markdown (preview)", spool.preview(), height=400)
+    if spool.truncated:
+        st.caption(f"Showing the first {spool.preview_chars:,} of {spool.chars:,} characters ({spool.size / 1_048_576:.1f} MB).")
+    project.file_name = st.text_input("Enter the name of the file to save:", project.file_name)
+    if project.file_name:
+        st.download_button("Download markdown file", data=spool.read_bytes, file_name=project.file_name, mime="text/markdown", on_click="ignore")
+
+# A fragment, so typing a file name reruns only this part; the preview is capped
+@st.fragment
+def show_output(project):
+    if project.output_spool is not None:
+        show_spooled_output(project)
+        return
+    st.markdown("## Markdown Output")
+    preview, truncated = project.markdown_preview(PREVIEW_CHARS)
+    st.text_area("Markdown", preview, height=400)
+    if truncated:
+        st.caption(f"Showing the first {PREVIEW_CHARS:,} characters; the download has all of them.")
+    project.file_name = st.text_input("Enter the name of the file to save:", project.file_name)
+    if project.file_name:
+        st.download_button("Download markdown file", data=lambda: project.markdown_output.encode(), file_name=project.file_name,
+                           mime="text/markdown", on_click="ignore")
+
+# Processing runs as a background job keyed by project, so it survives reruns.
+# URLs already converted with the same tags and conversion options are taken
+# from the store.
+def start_processing(project):
+    spans = url_spans(project.urls)
+    urls = [url for _, _, url in spans]
+    unique_urls, aliases = remove_duplicates_and_log(urls, project)
+    if not unique_urls:
+        return None
+    project.markdown_output = ""
+    store = get_store()
+    store.set_urls(project.id, {url: project.selected_tags for url in unique_urls}, conversion_options(project, unique_urls))
+    pending = list(store.pending_urls(project.id))
+    target = lambda job: convert_urls(pending, project, job.record, job.cancel_event, store)
+    return start_job(project.id, len(pending), target, context=(project.urls, spans, aliases))
+
+def finish_processing(project, job):
+    forget_job(project.id)
+    if job.error is not None:
+        st.error(f"Processing failed: {job.error}")
+        return
+    text, spans, aliases = job.context
+    deduper = None
+    if project.strip_boilerplate or project.near_duplicates != 'keep':
+        deduper = ContentDeduper(project.strip_boilerplate, project.near_duplicates)
+    results = {}
+
+    def log_duplicate(url, original):
+        project.log.append(near_duplicate_entry(url, original, project.near_duplicates == 'drop'))
+        if project.near_duplicates == 'drop':
+            results[url] = ""
+
+    # URLs that never ran because of a cancel stay in the text as they were
+    for url, markdown_content in iter_output(get_store(), project.id, deduper, log_duplicate):
+        results[url] = markdown_content + "\n\n"
+    project.dedupe_stats = deduper.stats if deduper is not None else None
+    # Every alias of a page gets the same content
+    replacements = {url: results[kept] for url, kept in aliases.items() if kept in results}
+    if project.stream_export:
+        if project.output_spool is not None:
+            project.output_spool.close()
+        # The input stays as typed; the output only lives in the spool
+        project.output_spool = substitute_urls(text, spans, replacements, MarkdownSpool())
     else:
-        hours, remainder = divmod(remaining_time_delta.seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        return f"{hours} hr {minutes} min {seconds} sec"
+        # Insert markdown content in the right place; the input stays as typed
+        # so the expanded text is only held once
+        project.markdown_output = substitute_urls(text, spans, replacements)
+    if job.cancelled:
+        st.warning(f"Cancelled after {job.done} of {job.total} URLs; the rest were left as links.")
 
 # Função principal do Streamlit
 def main():
     st.sidebar.title("Projects")
     session_state = st.session_state
 
+    store = get_store()
+    owner = owner_key(st.query_params)
     if 'projects' not in session_state:
-        session_state.projects = [Project("Project 1")]
+        session_state.projects = store.load_projects(Project, owner) or [Project("Project 1")]
 
     if st.sidebar.button("Add New Project"):
         new_project_name = f"Project {len(session_state.projects) + 1}"
         session_state.projects.append(Project(new_project_name))
         session_state.current_project = session_state.projects[-1]
+        store.save_project(session_state.current_project, len(session_state.projects) - 1, owner)
 
     project_names = [project.name for project in session_state.projects]
     selected_project_name = st.sidebar.selectbox("Select a Project", project_names, index=len(session_state.projects) - 1)
     session_state.current_project = next((project for project in session_state.projects if project.name == selected_project_name), None)
+    for project in session_state.projects:
+        project_job = get_job(project.id)
+        if project_job is not None and project_job.running:
+            st.sidebar.caption(f"{project.name}: {project_job.done}/{project_job.total} URLs")
+    st.sidebar.caption(f"Session memory: about {session_nbytes(session_state.projects) / 1_048_576:.1f} MB")
 
     st.title(session_state.current_project.name)
     tab1, tab2, tab3 = st.tabs(["Download", "Config", "Log"])
@@ -120,38 +190,26 @@ def main():
         session_state.current_project.ignore_links = st.checkbox("Ignore Links", value=session_state.current_project.ignore_links)
         session_state.current_project.ignore_images = st.checkbox("Ignore Images", value=session_state.current_project.ignore_images)
 
-        progress_bar_placeholder = st.empty()
-        time_left_placeholder = st.empty()
+        job = get_job(session_state.current_project.id)
         col1, col2 = st.columns([3, 1])
         with col1:
-            if st.button('Process Content'):
-                urls = re.findall(r'https?://[^\s)\]]+', session_state.current_project.urls)
-                unique_urls = remove_duplicates_and_log(urls, session_state.current_project)
-                if unique_urls:
-                    start_time = datetime.now()
-                    session_state.current_project.markdown_output = ""
-                    total_urls = len(unique_urls)
-                    progress_bar = progress_bar_placeholder.progress(0)
-                    for idx, url in enumerate(unique_urls):
-                        markdown_content = process_urls([url], session_state.current_project)
-                        # Insert markdown content in the right place
-                        session_state.current_project.urls = session_state.current_project.urls.replace(url, markdown_content)
-                        progress = (idx + 1) / total_urls
-                        progress_bar.progress(progress)
-                        time_left = estimate_time_left(start_time, progress, total_urls)
-                        time_left_placeholder.caption(f"Estimated time left: {time_left}")
-                    session_state.current_project.markdown_output = session_state.current_project.urls
-                    st.markdown("## Markdown Output")
-                    st.text_area("Markdown", session_state.current_project.markdown_output, height=400)
-                    session_state.current_project.file_name = st.text_input("Enter the name of the file to save:", session_state.current_project.file_name)
-                    if session_state.current_project.file_name:
-                        download_link = download_markdown(session_state.current_project.markdown_output, session_state.current_project.file_name)
-                        st.markdown(download_link, unsafe_allow_html=True)
+            if st.button('Process Content') and not (job and job.running):
+                job = start_processing(session_state.current_project)
+            if job is not None:
+                if job.running:
+                    show_job_progress(session_state.current_project)
+                else:
+                    finish_processing(session_state.current_project, job)
+
+            if session_state.current_project.output_spool is not None or session_state.current_project.has_markdown_output:
+                show_output(session_state.current_project)
         with col2:
             if st.button('Clear All'):
+                if job is not None:
+                    job.cancel()
+                    forget_job(session_state.current_project.id)
+                    job = None
                 clear_project_data(session_state.current_project)
-                progress_bar_placeholder.empty()
-                time_left_placeholder.empty()
 
     with tab2:
         new_name = st.text_input("Rename Project", value=session_state.current_project.name)
@@ -160,8 +218,38 @@ def main():
             project_names[project_names.index(selected_project_name)] = new_name
             st.rerun()
 
+        session_state.current_project.max_workers = st.number_input("Max parallel downloads", min_value=1, max_value=64, value=session_state.current_project.max_workers)
+        session_state.current_project.max_per_host = st.number_input("Max parallel downloads per host", min_value=1, max_value=16, value=session_state.current_project.max_per_host)
+        session_state.current_project.cpu_workers = st.number_input("Worker processes for parsing (0 = off)", min_value=0, max_value=available_cores(), value=min(session_state.current_project.cpu_workers, available_cores()))
+        session_state.current_project.connect_timeout = st.number_input("Connect timeout (seconds)", min_value=1.0, max_value=120.0, value=float(session_state.current_project.connect_timeout))
+        session_state.current_project.read_timeout = st.number_input("Read timeout (seconds)", min_value=1.0, max_value=600.0, value=float(session_state.current_project.read_timeout))
+        session_state.current_project.host_rate = st.number_input("Max requests per second per host", min_value=0.1, max_value=100.0, value=float(session_state.current_project.host_rate))
+        session_state.current_project.host_burst = st.number_input("Burst of requests per host", min_value=1, max_value=100, value=session_state.current_project.host_burst)
+        session_state.current_project.max_retries = st.number_input("Retries after 429/5xx or connection errors", min_value=0, max_value=10, value=session_state.current_project.max_retries)
+        session_state.current_project.respect_robots = st.checkbox("Respect robots.txt", value=session_state.current_project.respect_robots)
+
+        session_state.current_project.use_cache = st.checkbox("Use response cache", value=session_state.current_project.use_cache)
+        show_cache_stats(get_cache())
+        if st.button("Clear Response Cache"):
+            get_cache().clear()
+
+        session_state.current_project.extraction_mode = st.selectbox("Extraction mode", EXTRACTION_MODES, index=EXTRACTION_MODES.index(session_state.current_project.extraction_mode))
+        parsers = available_parsers()
+        session_state.current_project.parser = st.selectbox("HTML parser", parsers, index=parsers.index(session_state.current_project.parser) if session_state.current_project.parser in parsers else 0)
+        session_state.current_project.use_strainer = st.checkbox("Parse only the selected tags", value=session_state.current_project.use_strainer)
+        session_state.current_project.stream_export = st.checkbox("Stream export to a temporary file (preview only)", value=session_state.current_project.stream_export)
+        session_state.current_project.strip_boilerplate = st.checkbox("Strip blocks repeated on most pages of a host", value=session_state.current_project.strip_boilerplate)
+        session_state.current_project.near_duplicates = st.selectbox("Near-duplicate pages", NEAR_DUPLICATE_MODES, index=NEAR_DUPLICATE_MODES.index(session_state.current_project.near_duplicates))
+        max_download_mb = st.number_input("Max download size per page (MB)", min_value=0.1, max_value=1024.0, value=session_state.current_project.max_download_bytes / 1_048_576)
+        session_state.current_project.max_download_bytes = int(max_download_mb * 1_048_576)
+        session_state.current_project.html_only = st.checkbox("Skip pages that are not HTML", value=session_state.current_project.html_only)
+
+        st.markdown("#### Extraction profiles")
+        show_profiles(session_state.current_project)
+
         if st.button("Delete Project"):
             # Remove current project and update the state
+            store.delete_project(session_state.current_project.id, owner)
             session_state.projects = [project for project in session_state.projects if project.name != selected_project_name]
             if session_state.projects:
                 session_state.current_project = session_state.projects[0]
@@ -170,11 +258,14 @@ def main():
             st.rerun()
 
     with tab3:
-        if session_state.current_project and session_state.current_project.log:
-            for entry in session_state.current_project.log:
-                st.text(f"{entry['time']} - {entry['url']} - {entry['status']}")
+        if session_state.current_project:
+            show_log(session_state.current_project)
         else:
             st.text("No log entries.")
 
+    # Only the project on screen can have been edited
+    if session_state.current_project:
+        store.save_project(session_state.current_project, session_state.projects.index(session_state.current_project), owner)
+
 if __name__ == "__main__":
     main()
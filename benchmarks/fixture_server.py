@@ -0,0 +1,131 @@
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Local HTTP server for offline benchmarks. Synthetic pages are generated
+# deterministically from the query string:
+#
+#   /page?size=64&depth=8&mix=article&seed=3&latency=50&error=0.1
+#
+# size is the approximate body size in KB, depth the nesting depth of the
+# content block, mix one of TAG_MIXES, latency a delay in ms before the
+# response and error the probability of answering 503. Files from a
+# "recorded" directory are served under /recorded/<name>.
+
+TAG_MIXES = {
+    'article': ['article', 'p'],
+    'div_soup': ['div', 'div', 'span', 'p'],
+    'sections': ['section', 'header', 'p', 'ul'],
+    'lists': ['ul', 'li', 'ol', 'li'],
+}
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua").split()
+
+
+def make_block(rng, mix):
+    tag = rng.choice(TAG_MIXES[mix])
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+    if tag in ('ul', 'ol'):
+        items = "".join(f"<li>{words}</li>" for _ in range(3))
+        return f"<{tag}>{items}</{tag}>"
+    link = f' <a href="/page?seed={rng.randint(0, 10**6)}">{rng.choice(WORDS)}</a>'
+    image = f'<img src="/img/{rng.randint(0, 999)}.png" alt="{rng.choice(WORDS)}">' if rng.random() < 0.1 else ""
+    return f"<{tag}>{words}{link}{image}</{tag}>"
+
+
+def make_page(size_kb=32, depth=4, mix='article', seed=0):
+    rng = random.Random(f"{size_kb}-{depth}-{mix}-{seed}")
+    target = size_kb * 1024
+    blocks = []
+    total = 0
+    while total < target:
+        block = make_block(rng, mix)
+        blocks.append(block)
+        total += len(block)
+    body = "".join(blocks)
+    for level in range(depth):
+        wrapper = TAG_MIXES[mix][level % len(TAG_MIXES[mix])]
+        if wrapper in ('li', 'p', 'span'):
+            wrapper = 'div'
+        body = f'<{wrapper} class="level-{level}">{body}</{wrapper}>'
+    nav = "<nav><ul>" + "".join(f'<li><a href="/n{i}">{WORDS[i]}</a></li>' for i in range(8)) + "</ul></nav>"
+    footer = "<footer><p>Copyright fixture server</p></footer>"
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Fixture {seed}</title></head>"
+            f"<body>{nav}<article>{body}</article>{footer}</body></html>").encode()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    recorded_dir = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        latency = float(query.get('latency', 0)) / 1000
+        if latency:
+            time.sleep(latency)
+        error_rate = float(query.get('error', 0))
+        if error_rate and random.random() < error_rate:
+            return self.send_body(503, b"Service Unavailable", "text/plain")
+        if parts.path == '/page':
+            body = make_page(int(query.get('size', 32)), int(query.get('depth', 4)), query.get('mix', 'article'), query.get('seed', 0))
+            return self.send_body(200, body, "text/html; charset=utf-8")
+        if parts.path.startswith('/recorded/') and self.recorded_dir:
+            path = os.path.join(self.recorded_dir, os.path.basename(parts.path))
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    return self.send_body(200, f.read(), "text/html; charset=utf-8")
+        self.send_body(404, b"Not Found", "text/plain")
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer:
+    def __init__(self, recorded_dir=None, port=0):
+        handler = type("Handler", (FixtureHandler,), {"recorded_dir": recorded_dir})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def recorded_pages(self):
+        directory = self.httpd.RequestHandlerClass.recorded_dir
+        if not directory or not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if name.endswith(('.html', '.htm')))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve benchmark fixture pages.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--recorded', help="directory with recorded .html pages")
+    args = parser.parse_args()
+    with FixtureServer(args.recorded, args.port) as server:
+        print(f"Serving fixtures on {server.base_url}")
+        server.thread.join()
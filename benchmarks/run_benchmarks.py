@@ -0,0 +1,207 @@
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_server import FixtureServer
+from conversion import new_converter, clear_conversion_caches
+from extraction import parse_html, select_fragments
+from fetcher import fetch_concurrently
+from http_client import get_client
+from pipeline import Project, fetch_body, process_urls
+
+# Offline benchmark for the fetch -> parse -> extract -> convert pipeline.
+# Every tag configuration is run against every page profile served by the
+# local fixture server. Results go to a JSON file that --compare can diff
+# against an earlier run.
+#
+#   python benchmarks/run_benchmarks.py --pages 200 --latency-ms 20 --output bench.json
+#   python benchmarks/run_benchmarks.py --output new.json --compare bench.json
+
+TAG_CONFIGS = {
+    'article': ['article'],
+    'paragraphs': ['p'],
+    'nested': ['div', 'p', 'span'],
+    'sections': ['section', 'header', 'ul'],
+}
+
+PAGE_PROFILES = {
+    'small_flat': {'size': 8, 'depth': 2, 'mix': 'article'},
+    'medium_lists': {'size': 32, 'depth': 4, 'mix': 'lists'},
+    'large_deep': {'size': 128, 'depth': 16, 'mix': 'div_soup'},
+    'huge_sections': {'size': 512, 'depth': 8, 'mix': 'sections'},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def page_urls(base_url, profile, count, seed_offset, latency_ms, error_rate):
+    query = "&".join(f"{key}={value}" for key, value in profile.items())
+    return [f"{base_url}/page?{query}&seed={seed_offset + i}&latency={latency_ms}&error={error_rate}" for i in range(count)]
+
+
+def timed_page(url, tags, project, client):
+    stages = {}
+    try:
+        start = time.perf_counter()
+        body = fetch_body(url, client)
+        stages['fetch'] = time.perf_counter() - start
+        mark = time.perf_counter()
+        soup = parse_html(body, tags, project.extraction_mode, project.parser, project.use_strainer)
+        stages['parse'] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        content = select_fragments(soup, tags, project.extraction_mode)
+        stages['extract'] = time.perf_counter() - mark
+        mark = time.perf_counter()
+        new_converter(project.ignore_links, project.ignore_images).handle(content)
+        stages['convert'] = time.perf_counter() - mark
+        stages['total'] = time.perf_counter() - start
+        stages['bytes'] = len(body)
+    except Exception as e:
+        stages['error'] = str(e)
+    return stages
+
+
+def summarize(samples, wall_time):
+    ok = [sample for sample in samples if 'error' not in sample]
+    latencies = [sample['total'] for sample in ok]
+    summary = {
+        'pages': len(samples),
+        'errors': len(samples) - len(ok),
+        'wall_seconds': round(wall_time, 4),
+        'pages_per_sec': round(len(ok) / wall_time, 2) if wall_time else None,
+        'bytes': sum(sample['bytes'] for sample in ok),
+    }
+    for pct in (50, 95, 99):
+        value = percentile(latencies, pct)
+        summary[f'p{pct}_ms'] = round(value * 1000, 2) if value is not None else None
+    for stage in ('fetch', 'parse', 'extract', 'convert'):
+        summary[f'{stage}_seconds'] = round(sum(sample[stage] for sample in ok), 4)
+    return summary
+
+
+def run_case(base_url, tag_name, profile_name, args, seed_offset):
+    tags = TAG_CONFIGS[tag_name]
+    project = Project(f"bench-{tag_name}-{profile_name}")
+    project.selected_tags = tags
+    project.max_workers = args.workers
+    project.max_per_host = args.workers
+    project.use_cache = False
+    # Measure the pipeline, not the per-host politeness limits
+    project.host_rate = 1e9
+    project.max_retries = 0
+    project.respect_robots = False
+    project.extraction_mode = args.mode
+    project.parser = args.parser
+    project.use_strainer = args.strainer
+    project.cpu_workers = args.processes
+    client = get_client(project.connect_timeout, project.read_timeout, project.max_per_host)
+    profile = PAGE_PROFILES[profile_name]
+
+    # Stage split: fetch, parse, extract and convert timed per URL
+    clear_conversion_caches()
+    urls = page_urls(base_url, profile, args.pages, seed_offset, args.latency_ms, args.error_rate)
+    start = time.perf_counter()
+    samples = fetch_concurrently(urls, lambda url: timed_page(url, tags, project, client), project.max_workers, project.max_per_host)
+    result = summarize(samples, time.perf_counter() - start)
+
+    # End to end through process_urls, on pages the memo caches have not seen
+    clear_conversion_caches()
+    urls = page_urls(base_url, profile, args.pages, seed_offset + args.pages, args.latency_ms, args.error_rate)
+    start = time.perf_counter()
+    process_urls({url: tags for url in urls}, project)
+    elapsed = time.perf_counter() - start
+    result['process_urls_pages_per_sec'] = round(len(urls) / elapsed, 2)
+
+    result.update({'tags': tag_name, 'profile': profile_name, 'peak_rss_mb': round(peak_rss_mb(), 1)})
+    return result
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['tags'], r['profile']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result['tags'], result['profile']))
+        if not old or not old.get('pages_per_sec'):
+            continue
+        change = (result['pages_per_sec'] - old['pages_per_sec']) / old['pages_per_sec'] * 100
+        print(f"  {result['tags']:<12} {result['profile']:<14} {old['pages_per_sec']:>9} -> {result['pages_per_sec']:>9} pages/s ({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the URL to Markdown pipeline.")
+    parser.add_argument('--pages', type=int, default=50, help="pages per tag/profile case")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=0, help="worker processes used by process_urls")
+    parser.add_argument('--latency-ms', type=float, default=0, help="latency injected by the fixture server")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with 503")
+    parser.add_argument('--mode', default='single_pass')
+    parser.add_argument('--parser', default='html.parser')
+    parser.add_argument('--strainer', action='store_true')
+    parser.add_argument('--tags', nargs='+', choices=sorted(TAG_CONFIGS), default=sorted(TAG_CONFIGS))
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PAGE_PROFILES), default=sorted(PAGE_PROFILES))
+    parser.add_argument('--recorded', help="directory of recorded .html pages to add as a profile")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="earlier results file to compare pages/sec against")
+    args = parser.parse_args(argv)
+
+    results = []
+    with FixtureServer(args.recorded) as server:
+        profiles = list(args.profiles)
+        seed_offset = 0
+        for tag_name in args.tags:
+            for profile_name in profiles:
+                result = run_case(server.base_url, tag_name, profile_name, args, seed_offset)
+                seed_offset += 2 * args.pages
+                results.append(result)
+                print(f"{tag_name:<12} {profile_name:<14} {result['pages_per_sec']:>9} pages/s  "
+                      f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                      f"fetch/parse/extract/convert {result['fetch_seconds']}/{result['parse_seconds']}/"
+                      f"{result['extract_seconds']}/{result['convert_seconds']} s  rss {result['peak_rss_mb']} MB")
+            for page in server.recorded_pages():
+                url = f"{server.base_url}/recorded/{page}"
+                project = Project("bench-recorded")
+                project.use_cache = False
+                client = get_client()
+                start = time.perf_counter()
+                samples = [timed_page(url, TAG_CONFIGS[tag_name], project, client)]
+                result = summarize(samples, time.perf_counter() - start)
+                result.update({'tags': tag_name, 'profile': f"recorded/{page}", 'peak_rss_mb': round(peak_rss_mb(), 1)})
+                results.append(result)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import hashlib
+import math
+import threading
+
+
+# Thread-safe Bloom filter: a fixed-size bit array, so remembering 100k URLs
+# costs ~180 KB at the default error rate instead of the strings themselves.
+# A false positive means an unseen item is occasionally reported as seen.
+class BloomFilter:
+    def __init__(self, capacity=100_000, error_rate=0.001):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, item):
+        if isinstance(item, str):
+            item = item.encode()
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    # Returns True if the item was not in the filter yet
+    def add(self, item):
+        positions = self._positions(item)
+        with self._lock:
+            added = False
+            for pos in positions:
+                mask = 1 << (pos & 7)
+                if not self._bits[pos >> 3] & mask:
+                    self._bits[pos >> 3] |= mask
+                    added = True
+            if added:
+                self._count += 1
+            return added
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,121 @@
+import hashlib
+import re
+from collections import Counter, defaultdict
+
+from fetcher import host_of
+
+# Optional clean-up of the converted pages of a run, done in two passes over
+# the results: observe() every page first, then clean() them in order.
+# Markdown blocks (paragraphs) that repeat on most pages of a host - menus,
+# cookie banners, footers - are stripped, and pages whose SimHash is within
+# a few bits of an earlier page are flagged or dropped.
+
+NEAR_DUPLICATE_MODES = ['keep', 'flag', 'drop']
+# A block is boilerplate when it is on at least this share of a host's pages
+DEFAULT_THRESHOLD = 0.6
+# Hosts with fewer pages are left alone
+DEFAULT_MIN_PAGES = 3
+# Pages whose 64-bit SimHashes differ in at most this many bits are near-duplicates
+DEFAULT_MAX_DISTANCE = 3
+SHINGLE_WORDS = 3
+
+_space = re.compile(r"\s+")
+_word = re.compile(r"\w+")
+
+
+def split_blocks(markdown_text):
+    return [block for block in markdown_text.split("\n\n") if block.strip()]
+
+
+def block_hash(block):
+    normalized = _space.sub(" ", block).strip().lower()
+    return hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+
+
+def simhash(text):
+    words = _word.findall(text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little") for shingle in shingles]
+    half = len(hashes) / 2
+    value = 0
+    for bit in range(64):
+        if sum((h >> bit) & 1 for h in hashes) > half:
+            value |= 1 << bit
+    return value
+
+
+class ContentDeduper:
+    def __init__(self, strip_boilerplate=True, near_duplicates='drop', threshold=DEFAULT_THRESHOLD,
+                 min_pages=DEFAULT_MIN_PAGES, max_distance=DEFAULT_MAX_DISTANCE):
+        self.strip_boilerplate = strip_boilerplate
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.max_distance = max_distance
+        # host -> number of pages, host -> Counter of block hashes (one per page)
+        self._pages = Counter()
+        self._blocks = defaultdict(Counter)
+        # max_distance + 1 bands: two hashes within max_distance bits share at
+        # least one band exactly, so only pages in the same bucket are compared
+        self._bands = max_distance + 1
+        self._buckets = defaultdict(list)
+        self.stats = {'pages': 0, 'input_bytes': 0, 'output_bytes': 0, 'boilerplate_blocks': 0,
+                      'boilerplate_bytes': 0, 'near_duplicates': 0, 'duplicate_bytes': 0}
+
+    def observe(self, url, markdown_text):
+        if not self.strip_boilerplate:
+            return
+        host = host_of(url)
+        self._pages[host] += 1
+        self._blocks[host].update({block_hash(block) for block in split_blocks(markdown_text)})
+
+    def _is_boilerplate(self, host, digest):
+        pages = self._pages[host]
+        return pages >= self.min_pages and self._blocks[host][digest] >= self.threshold * pages
+
+    def _band_keys(self, value):
+        width = 64 // self._bands
+        return [(band, (value >> (band * width)) & ((1 << width) - 1)) for band in range(self._bands)]
+
+    def _find_near_duplicate(self, url, value):
+        keys = self._band_keys(value)
+        match = None
+        for key in keys:
+            for other_value, other_url in self._buckets[key]:
+                if bin(value ^ other_value).count("1") <= self.max_distance:
+                    match = other_url
+                    break
+            if match:
+                break
+        if match is None:
+            for key in keys:
+                self._buckets[key].append((value, url))
+        return match
+
+    # Returns (markdown, duplicate_of): the page without its boilerplate, and
+    # the earlier URL it nearly duplicates (markdown is None when dropped).
+    def clean(self, url, markdown_text):
+        size = len(markdown_text.encode())
+        self.stats['pages'] += 1
+        self.stats['input_bytes'] += size
+        if self.strip_boilerplate:
+            host = host_of(url)
+            kept = []
+            for block in split_blocks(markdown_text):
+                if self._is_boilerplate(host, block_hash(block)):
+                    self.stats['boilerplate_blocks'] += 1
+                    self.stats['boilerplate_bytes'] += len(block.encode()) + 2
+                else:
+                    kept.append(block)
+            markdown_text = "\n\n".join(kept) + "\n" if kept else ""
+        duplicate_of = None
+        if self.near_duplicates != 'keep' and markdown_text.strip():
+            duplicate_of = self._find_near_duplicate(url, simhash(markdown_text))
+            if duplicate_of is not None:
+                self.stats['near_duplicates'] += 1
+                if self.near_duplicates == 'drop':
+                    self.stats['duplicate_bytes'] += len(markdown_text.encode())
+                    markdown_text = None
+        if markdown_text is not None:
+            self.stats['output_bytes'] += len(markdown_text.encode())
+        return markdown_text, duplicate_of
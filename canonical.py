@@ -0,0 +1,137 @@
+import re
+import threading
+import time
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from lru import LRUCache
+
+# URL normalization and deduplication. Before fetching, inputs are collapsed
+# on a normalized key (scheme, fragment, tracking parameters and trailing
+# slashes don't matter) and on permanent redirects/rel=canonical seen
+# earlier in this process. After fetching, AliasClaims catches pages that
+# turned out to be the same as one already converted in the run, going by
+# where each fetch actually landed.
+
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl", "igshid"}
+# How much of a page is searched for <link rel="canonical">
+CANONICAL_SNIFF_CHARS = 16384
+MAX_ALIAS_HOPS = 5
+# Learned aliases are forgotten after this many seconds
+ALIAS_TTL = 24 * 3600
+PERMANENT_REDIRECTS = {301, 308}
+
+_link_tag = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_attribute = re.compile(r'([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+
+def _without_tracking(query):
+    pairs = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+             if not name.lower().startswith(TRACKING_PREFIXES) and name.lower() not in TRACKING_PARAMS]
+    return urlencode(pairs)
+
+# The URL actually fetched: only the fragment and tracking parameters go,
+# since servers may treat case or a trailing slash differently
+def strip_tracking(url):
+    parts = urlsplit(url.strip())
+    query = parts.query
+    # Rewritten only when something goes: "?a" would come back as "?a="
+    if query and _without_tracking(query) != urlencode(parse_qsl(query, keep_blank_values=True)):
+        query = _without_tracking(query)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, _without_tracking(parts.query), ""))
+
+# Key under which equivalent URLs collapse; http and https count as the same page
+def url_key(url):
+    return normalize_url(url).split("://", 1)[-1]
+
+
+def canonical_link(html, base_url):
+    for tag in _link_tag.findall(html[:CANONICAL_SNIFF_CHARS]):
+        # Only one of the three value groups matches
+        attributes = {name.lower(): "".join(values) for name, *values in _attribute.findall(tag)}
+        if "canonical" in attributes.get("rel", "").lower().split() and attributes.get("href"):
+            return urljoin(base_url, attributes["href"])
+    return None
+
+
+# Process-wide map of url_key -> (url_key, expiry on the monotonic clock)
+# learned from permanent (301/308) redirects and rel=canonical, bounded like
+# the other in-memory caches
+_aliases = LRUCache(max_bytes=8 * 1024 * 1024, sizeof=lambda entry: len(entry[0]))
+
+
+def remember_alias(url, target):
+    key, target_key = url_key(url), url_key(target)
+    if key == target_key:
+        _aliases.pop(key)
+    else:
+        _aliases.put(key, (target_key, time.monotonic() + ALIAS_TTL))
+
+
+# For a URL that now serves its own page or redirects only temporarily
+def forget_alias(url):
+    _aliases.pop(url_key(url))
+
+
+def resolve_key(url):
+    key = url_key(url)
+    now = time.monotonic()
+    for _ in range(MAX_ALIAS_HOPS):
+        entry = _aliases.get(key)
+        if entry is None or entry[1] <= now or entry[0] == key:
+            break
+        key = entry[0]
+    return key
+
+
+# Returns (unique, aliases): the URLs to fetch (see strip_tracking), in input order, and
+# for every input URL the entry of unique that stands for it.
+# on_collapse(url, kept, reason) is called for every input that collapsed
+# into an earlier one.
+def dedupe_urls(urls, on_collapse=None):
+    unique = []
+    aliases = {}
+    kept_by_key = {}
+    for url in urls:
+        if url in aliases:
+            if on_collapse is not None:
+                on_collapse(url, aliases[url], "duplicate")
+            continue
+        key = url_key(url)
+        resolved = resolve_key(url)
+        kept = kept_by_key.get(key) or kept_by_key.get(resolved)
+        if kept is None:
+            kept = kept_by_key[key] = kept_by_key[resolved] = strip_tracking(url)
+            unique.append(kept)
+        elif on_collapse is not None:
+            reason = "same page after normalization" if url_key(kept) == key else "known redirect or rel=canonical"
+            on_collapse(url, kept, reason)
+        aliases[url] = kept
+    return unique, aliases
+
+
+# Tracks which URL of a run first produced each page (after redirects and
+# rel=canonical); claim() returns that URL when another one got there first.
+# page_url is where the fetch of url landed: its final URL, or the
+# rel=canonical it named (see pipeline.fetch_body).
+class AliasClaims:
+    def __init__(self):
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def claim(self, url, page_url=None):
+        key = resolve_key(page_url or url)
+        with self._lock:
+            owner = self._owners.setdefault(key, url)
+        return owner if owner != url else None
@@ -0,0 +1,132 @@
+import json
+import re
+from functools import lru_cache
+from importlib.util import find_spec
+
+# Splits each page's Markdown into chunks under a token budget for LLM
+# ingestion. Chunks break between blocks (paragraphs, lists, code), prefer to
+# start at a heading, and carry the source URL and heading path. Every block
+# is counted once; a chunk's size is the sum of its blocks plus separators.
+
+DEFAULT_CHUNK_TOKENS = 512
+BLOCK_SEPARATOR = "\n\n"
+
+_heading = re.compile(r"^(#{1,6})\s+(.*)")
+
+
+# About four characters per token for English prose, without a tokenizer
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def available_token_counters():
+    counters = ['estimate']
+    if find_spec('tiktoken') is not None:
+        counters.append('tiktoken')
+    return counters
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(name='estimate'):
+    if name == 'tiktoken':
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens
+
+
+# Returns (piece, tokens) pairs. Lines first, then words; a single word over
+# budget is kept whole. Each part is counted once and a piece's size is the
+# sum of its parts and separators, like a chunk's.
+def _split_oversized(text, tokens, budget, count):
+    for separator in ("\n", " "):
+        parts = text.split(separator)
+        if len(parts) == 1:
+            continue
+        separator_tokens = count(separator)
+        pieces = []
+        current = []
+        current_tokens = 0
+        for part in parts:
+            part_tokens = count(part)
+            if current and current_tokens + separator_tokens + part_tokens > budget:
+                pieces.append((separator.join(current), current_tokens))
+                current, current_tokens = [], 0
+            current_tokens += part_tokens + (separator_tokens if current else 0)
+            current.append(part)
+        pieces.append((separator.join(current), current_tokens))
+        # Only a single part can be over budget here
+        return [item for piece, piece_tokens in pieces
+                for item in (_split_oversized(piece, piece_tokens, budget, count) if piece_tokens > budget else [(piece, piece_tokens)])]
+    return [(text, tokens)]
+
+
+# Yields (text, tokens, heading_level) for each block; heading_level is 0 for
+# blocks that aren't headings
+def markdown_blocks(markdown_text, budget, count):
+    for block in markdown_text.split(BLOCK_SEPARATOR):
+        block = block.strip("\n")
+        if not block.strip():
+            continue
+        match = _heading.match(block)
+        tokens = count(block)
+        if tokens <= budget:
+            yield block, tokens, len(match.group(1)) if match else 0
+        else:
+            for piece, piece_tokens in _split_oversized(block, tokens, budget, count):
+                yield piece, piece_tokens, 0
+
+
+# Returns the chunks of one page as dicts with url, chunk, chunks, headings
+# (the heading path where the chunk starts), tokens and text
+def chunk_markdown(url, markdown_text, budget=DEFAULT_CHUNK_TOKENS, count=estimate_tokens):
+    separator_tokens = count(BLOCK_SEPARATOR)
+    chunks = []
+    headings = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        chunks.append({"url": url, "chunk": len(chunks) + 1, "chunks": None,
+                       "headings": [title for _, title in current[0][3]], "tokens": current_tokens,
+                       "text": BLOCK_SEPARATOR.join(block[0] for block in current)})
+
+    for text, tokens, level in markdown_blocks(markdown_text, budget, count):
+        if level:
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, _heading.match(text).group(2).strip()))
+        block = (text, tokens, level, tuple(headings))
+        # Start a new chunk when the block doesn't fit, or at a heading once
+        # the chunk is half full
+        if current and (current_tokens + separator_tokens + tokens > budget or (level and current_tokens >= budget // 2)):
+            # Headings at the end go with the content that follows them, if
+            # they fit together
+            carried = []
+            while len(current) > 1 and current[-1][2]:
+                carried.insert(0, current.pop())
+                current_tokens -= carried[0][1] + separator_tokens
+            carried_tokens = sum(item[1] + separator_tokens for item in carried)
+            if carried_tokens + tokens > budget:
+                current += carried
+                current_tokens += carried_tokens
+                carried, carried_tokens = [], 0
+            flush()
+            current = carried
+            current_tokens = carried_tokens - separator_tokens if carried else 0
+        current_tokens += tokens + (separator_tokens if current else 0)
+        current.append(block)
+    if current:
+        flush()
+    for chunk in chunks:
+        chunk["chunks"] = len(chunks)
+    return chunks
+
+
+def chunks_to_jsonl(chunks):
+    return "".join(json.dumps(chunk, ensure_ascii=False) + "\n" for chunk in chunks)
+
+
+def chunk_file_text(chunk):
+    return (f"---\nsource: {chunk['url']}\nchunk: {chunk['chunk']}/{chunk['chunks']}\n"
+            f"tokens: {chunk['tokens']}\n---\n\n{chunk['text']}\n")
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+from extraction import available_parsers, EXTRACTION_MODES
+from fetcher import available_cores
+from http_client import SkippedResponse
+from conversion import ConversionFailed
+from discovery import discover_urls, DEFAULT_MAX_URLS
+from canonical import dedupe_urls, AliasClaims
+from export import output_file_name, ArchiveWriter
+from chunking import available_token_counters, get_token_counter, chunk_markdown, chunk_file_text
+from pipeline import Project, remove_duplicates, fetch_markdown, project_client, project_cache, project_pool, project_politeness, convert_urls, result_status
+from store import DUPLICATE
+from politeness import DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_RETRIES
+from profiles import profiles_from_json, match_profile, profile_selectors
+from substitution import URL_PATTERN
+
+# Headless batch entry point: reads URLs from files or stdin and writes the
+# Markdown for each URL to a directory or a JSONL stream.
+#
+#   python cli.py urls.txt --tags article main --output-dir out/
+#   cat urls.txt | python cli.py --jsonl - > results.jsonl
+#   python cli.py --discover https://docs.example.com/ --crawl-depth 2 --output-dir out/
+#   python cli.py urls.txt --chunk-tokens 512 --jsonl chunks.jsonl
+
+
+def read_urls(paths):
+    urls = []
+    for path in paths or ['-']:
+        if path == '-':
+            urls.extend(URL_PATTERN.findall(sys.stdin.read()))
+        else:
+            with open(path, encoding='utf-8') as f:
+                urls.extend(URL_PATTERN.findall(f.read()))
+    return remove_duplicates(urls)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert web pages to Markdown without the Streamlit UI.")
+    parser.add_argument('inputs', nargs='*', help="files with URLs (default: stdin, or '-'; none with --discover)")
+    parser.add_argument('--discover', action='append', metavar='SEED', help="also convert the pages found from this site or sitemap URL")
+    parser.add_argument('--no-sitemap', action='store_true', help="don't read sitemaps when discovering")
+    parser.add_argument('--crawl-depth', type=int, default=0, help="follow same-site links this many levels from the seeds")
+    parser.add_argument('--max-urls', type=int, default=DEFAULT_MAX_URLS, help="max URLs to discover")
+    parser.add_argument('--tags', nargs='+', default=['article'], help="HTML tags to convert (default: article)")
+    parser.add_argument('--keep-links', action='store_true', help="keep links in the Markdown")
+    parser.add_argument('--keep-images', action='store_true', help="keep images in the Markdown")
+    parser.add_argument('--workers', type=int, default=8, help="max parallel downloads")
+    parser.add_argument('--per-host', type=int, default=2, help="max parallel downloads per host")
+    parser.add_argument('--processes', type=int, default=0,
+                        help=f"worker processes for parsing and conversion (0 = none; this host has {available_cores()} cores)")
+    parser.add_argument('--connect-timeout', type=float, default=None)
+    parser.add_argument('--read-timeout', type=float, default=None)
+    parser.add_argument('--no-cache', action='store_true', help="bypass the response cache")
+    parser.add_argument('--mode', choices=EXTRACTION_MODES, default='single_pass')
+    parser.add_argument('--parser', choices=available_parsers(), default='html.parser')
+    parser.add_argument('--strainer', action='store_true', help="parse only the selected tags")
+    parser.add_argument('--max-mb', type=float, default=None, help="skip pages larger than this many MB (default: 10)")
+    parser.add_argument('--any-content-type', action='store_true', help="also convert pages that are not served as HTML")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="max requests per second to each host")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="requests a host may get at once before --rate applies")
+    parser.add_argument('--retries', type=int, default=DEFAULT_MAX_RETRIES, help="retries after 429/5xx responses and connection errors")
+    parser.add_argument('--ignore-robots', action='store_true', help="fetch pages that robots.txt disallows")
+    parser.add_argument('--profiles', help="JSON file with per-domain extraction profiles (CSS selectors)")
+    parser.add_argument('--chunk-tokens', type=int, default=0,
+                        help="split each page into chunks of at most this many tokens (one JSON line or file per chunk; not with --archive)")
+    parser.add_argument('--token-counter', choices=available_token_counters(), default='estimate')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--output-dir', help="write one .md file per URL into this directory")
+    output.add_argument('--jsonl', default='-', help="write one JSON object per URL to this file (default: stdout)")
+    output.add_argument('--archive', help="write a .zip (or .tar.zst) with one .md file per URL and a manifest")
+    return parser
+
+
+def project_from_args(args):
+    project = Project("cli")
+    project.selected_tags = args.tags
+    project.ignore_links = not args.keep_links
+    project.ignore_images = not args.keep_images
+    project.max_workers = args.workers
+    project.max_per_host = args.per_host
+    project.cpu_workers = args.processes
+    if args.connect_timeout is not None:
+        project.connect_timeout = args.connect_timeout
+    if args.read_timeout is not None:
+        project.read_timeout = args.read_timeout
+    project.use_cache = not args.no_cache
+    project.extraction_mode = args.mode
+    project.parser = args.parser
+    project.use_strainer = args.strainer
+    if args.max_mb is not None:
+        project.max_download_bytes = int(args.max_mb * 1_048_576)
+    project.html_only = not args.any_content_type
+    project.host_rate = args.rate
+    project.host_burst = args.burst
+    project.max_retries = args.retries
+    project.respect_robots = not args.ignore_robots
+    if args.profiles:
+        with open(args.profiles, encoding='utf-8') as f:
+            project.profiles = profiles_from_json(f.read())
+    return project
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.chunk_tokens and args.archive:
+        parser.error("--chunk-tokens can't be used with --archive")
+    project = project_from_args(args)
+    urls = read_urls(args.inputs) if args.inputs or not args.discover else []
+    client = project_client(project)
+    cache = project_cache(project)
+    pool = project_pool(project)
+    if args.discover:
+        discovered = discover_urls(args.discover, client, cache, not args.no_sitemap, args.crawl_depth, args.max_urls,
+                                   max_workers=project.max_workers, max_per_host=project.max_per_host, max_bytes=project.max_download_bytes,
+                                   on_skip=lambda url, reason: print(f"{url} - Skipped: {reason}", file=sys.stderr),
+                                   politeness=project_politeness(project))
+        print(f"Discovered {len(discovered)} URLs", file=sys.stderr)
+        urls = urls + discovered
+    urls, _ = dedupe_urls(urls, lambda url, kept, reason: print(f"{url} - Collapsed into {kept} ({reason})", file=sys.stderr))
+    project.urls_tags = {url: project.selected_tags for url in urls}
+    claims = AliasClaims()
+    politeness = project_politeness(project, len(urls))
+
+    def convert(url, tags):
+        page = {}
+        try:
+            markdown_text = fetch_markdown(url, tags, project.ignore_links, project.ignore_images, client, cache,
+                                           project.extraction_mode, project.parser, project.use_strainer, pool, None,
+                                           project.max_download_bytes, project.html_only, politeness,
+                                           profile_selectors(match_profile(url, project.profiles)), page)
+            owner = claims.claim(url, page.get("url"))
+            if owner is not None:
+                return {"url": url, "status": f"Collapsed into {owner} (redirect or rel=canonical)", "markdown": ""}
+            return {"url": url, "status": "OK", "markdown": markdown_text}
+        except SkippedResponse as e:
+            return {"url": url, "status": f"Skipped: {e}", "markdown": ""}
+        except (requests.RequestException, ValueError, ConversionFailed) as e:
+            return {"url": url, "status": f"Error: {e}", "markdown": ""}
+
+    archive = None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        stream = None
+    elif args.archive:
+        archive = ArchiveWriter('tar.zst' if args.archive.endswith('.tar.zst') else 'zip')
+        stream = None
+    else:
+        stream = sys.stdout if args.jsonl == '-' else open(args.jsonl, 'w', encoding='utf-8')
+
+    failures = 0
+    count = get_token_counter(args.token_counter)
+
+    def write_chunks(url, chunks):
+        if stream is not None:
+            for chunk in chunks:
+                stream.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            stream.flush()
+            return
+        base = output_file_name(url)[:-3]
+        for chunk in chunks:
+            with open(os.path.join(args.output_dir, f"{base}-{chunk['chunk']:03d}.md"), 'w', encoding='utf-8') as f:
+                f.write(chunk_file_text(chunk))
+
+    def write_result(idx, result, done, total):
+        nonlocal failures
+        if result["status"].startswith("Error"):
+            failures += 1
+        if archive is not None:
+            # The manifest uses the store's statuses, like the app's archive
+            status = DUPLICATE if result["status"].startswith("Collapsed") else result_status(result["status"])
+            archive.add(result["url"], status, result["markdown"])
+        elif args.chunk_tokens and result["status"] == "OK":
+            write_chunks(result["url"], chunk_markdown(result["url"], result["markdown"], args.chunk_tokens, count))
+        elif stream is not None:
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+            stream.flush()
+        elif result["status"] == "OK":
+            with open(os.path.join(args.output_dir, output_file_name(result["url"])), 'w', encoding='utf-8') as f:
+                f.write(result["markdown"])
+        print(f"[{done}/{total}] {result['url']} - {result['status']}", file=sys.stderr)
+
+    try:
+        convert_urls(project.urls_tags, project, convert, write_result, keep_results=False, politeness=politeness)
+    finally:
+        if stream is not None and stream is not sys.stdout:
+            stream.close()
+        if archive is not None:
+            archive.close()
+            with open(args.archive, 'wb') as f:
+                archive.copy_to(f)
+            archive.discard()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import sys
+import zlib
+from collections import deque
+from datetime import datetime
+
+from metrics import METRIC_FIELDS
+
+# Compact forms of what every session keeps per project. The log is a
+# bounded ring buffer of tuples with numeric timestamps instead of a list of
+# dicts, and large text (the combined Markdown) is held zlib-compressed. The
+# per-URL results themselves live once, in the store.
+
+DEFAULT_LOG_ENTRIES = 1000
+# Shorter text stays a str; compressing it wouldn't pay off
+COMPRESS_MIN_CHARS = 4096
+ROW_FIELDS = ['time', 'url', 'status'] + METRIC_FIELDS
+
+_missing = object()
+
+
+def pack_text(text):
+    if text is None or len(text) < COMPRESS_MIN_CHARS:
+        return text
+    return zlib.compress(text.encode(), 1)
+
+
+def unpack_text(value):
+    return zlib.decompress(value).decode() if isinstance(value, bytes) else value
+
+
+# The first chars characters, without decompressing the rest; returns
+# (text, truncated)
+def text_preview(value, chars):
+    if not isinstance(value, bytes):
+        value = value or ""
+        return value[:chars], len(value) > chars
+    decompressor = zlib.decompressobj()
+    # A character is at most four bytes; a character cut at the end is dropped
+    text = decompressor.decompress(value, chars * 4).decode(errors="ignore")
+    return text[:chars], len(text) > chars or not decompressor.eof
+
+
+def format_time(timestamp):
+    # Entries logged before timestamps were numeric hold the formatted string
+    if isinstance(timestamp, str):
+        return timestamp
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Keeps the last capacity entries; iterating yields them as dicts again, with
+# only the fields they were logged with. dropped counts the entries pushed out.
+class RunLog:
+    __slots__ = ('_rows', 'dropped')
+
+    def __init__(self, entries=(), capacity=DEFAULT_LOG_ENTRIES):
+        self._rows = deque(maxlen=capacity)
+        self.dropped = 0
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        if len(self._rows) == self._rows.maxlen:
+            self.dropped += 1
+        row = [entry.get(field, _missing) for field in ROW_FIELDS]
+        while row and row[-1] is _missing:
+            row.pop()
+        self._rows.append(tuple(row))
+
+    # Workers append while the UI reads; list() copies without letting them in
+    def _snapshot(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        for row in self._snapshot():
+            yield {field: value for field, value in zip(ROW_FIELDS, row) if value is not _missing}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def clear(self):
+        self._rows.clear()
+        self.dropped = 0
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self._rows) + sum(_nbytes(row, set()) for row in self._snapshot())
+
+
+def _nbytes(value, seen):
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, RunLog):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_nbytes(key, seen) + _nbytes(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_nbytes(item, seen) for item in value)
+    return size
+
+
+# Approximate memory a project holds in the session. Spooled output and
+# archives are on disk and only count as their small Python objects.
+def project_nbytes(project):
+    seen = set()
+    return sys.getsizeof(project) + sum(_nbytes(getattr(project, name, None), seen) for name in type(project).__slots__)
+
+
+def session_nbytes(projects):
+    return sum(project_nbytes(project) for project in projects)
@@ -0,0 +1,91 @@
+import hashlib
+import time
+
+import html2text
+
+from extraction import parse_html, select_content
+from lru import LRUCache
+
+# Extracted HTML fragments keyed on (body hash, tag set, extraction options,
+# profile selectors)
+fragment_cache = LRUCache(max_bytes=64 * 1024 * 1024)
+# Markdown keyed on (fragment hash, ignore_links, ignore_images)
+markdown_cache = LRUCache(max_bytes=64 * 1024 * 1024)
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# html2text keeps list, table and inline state across handle() calls, so
+# every document gets a fresh converter
+def new_converter(ignore_links, ignore_images):
+    converter = html2text.HTML2Text()
+    converter.ignore_links = ignore_links
+    converter.ignore_images = ignore_images
+    return converter
+
+
+# The optional metrics dict receives the parse/extract/convert seconds (0 on
+# a memo hit) and the size of the Markdown produced. selectors are a
+# profile's (include, exclude) CSS selectors, see profiles.py.
+def cached_extract(body, tags, mode='single_pass', parser='html.parser', use_strainer=False, metrics=None, selectors=None):
+    # Order only matters when each tag is searched separately
+    tag_key = tuple(tags) if mode == 'per_tag' else frozenset(tags)
+    key = (content_hash(body), tag_key, mode, parser, use_strainer, selectors)
+    content = fragment_cache.get(key)
+    parse_time = extract_time = 0.0
+    if content is None:
+        start = time.perf_counter()
+        # The strainer only knows tag names, so include selectors need the whole page
+        soup = parse_html(body, tags, mode, parser, use_strainer and not (selectors and selectors[0]))
+        parsed = time.perf_counter()
+        content = select_content(soup, tags, mode, selectors)
+        parse_time, extract_time = parsed - start, time.perf_counter() - parsed
+        fragment_cache.put(key, content)
+    if metrics is not None:
+        metrics["parse"] = parse_time
+        metrics["extract"] = extract_time
+    return content
+
+
+def cached_convert(content, ignore_links, ignore_images, metrics=None):
+    key = (content_hash(content), ignore_links, ignore_images)
+    markdown_text = markdown_cache.get(key)
+    convert_time = 0.0
+    if markdown_text is None:
+        start = time.perf_counter()
+        markdown_text = new_converter(ignore_links, ignore_images).handle(content)
+        convert_time = time.perf_counter() - start
+        markdown_cache.put(key, markdown_text)
+    if metrics is not None:
+        metrics["convert"] = convert_time
+        metrics["output_bytes"] = len(markdown_text.encode())
+    return markdown_text
+
+
+# Whole parse + convert step for one downloaded body. It is a plain module
+# level function so it can also run in a worker process.
+# Raised for a page whose conversion failed in a worker process for another
+# reason than its content, e.g. the worker died
+class ConversionFailed(Exception):
+    pass
+
+
+def convert_body(body, tags, ignore_links, ignore_images, mode='single_pass', parser='html.parser', use_strainer=False, metrics=None, selectors=None):
+    content = cached_extract(body, tags, mode, parser, use_strainer, metrics, selectors)
+    if not content:
+        raise ValueError("No content matched the profile's selectors." if selectors and selectors[0] else "No specified tags found in the HTML.")
+    return cached_convert(content, ignore_links, ignore_images, metrics)
+
+
+# Worker-process variant: the metrics travel back with the result
+def convert_body_with_metrics(body, tags, ignore_links, ignore_images, mode='single_pass', parser='html.parser', use_strainer=False, selectors=None):
+    metrics = {}
+    markdown_text = convert_body(body, tags, ignore_links, ignore_images, mode, parser, use_strainer, metrics, selectors)
+    return markdown_text, metrics
+
+
+def clear_conversion_caches():
+    fragment_cache.clear()
+    markdown_cache.clear()
@@ -0,0 +1,181 @@
+import gzip
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+from bloom import BloomFilter
+from fetcher import fetch_concurrently, host_of
+from http_client import get_client, SkippedResponse, DEFAULT_MAX_DOWNLOAD_BYTES
+from pipeline import fetch_body
+from politeness import get_robots_cache
+
+# Expands a site into page URLs from its sitemaps and, optionally, by
+# following same-host links. Memory stays bounded: the result list is capped
+# at max_urls, the crawl frontier at frontier_size and seen URLs live in a
+# Bloom filter.
+
+DEFAULT_MAX_URLS = 1000
+DEFAULT_FRONTIER_SIZE = 10_000
+# Child sitemaps followed from sitemap indexes, per discovery run
+MAX_SITEMAPS = 1000
+GZIP_CONTENT_TYPES = ("application/gzip", "application/x-gzip")
+
+
+def clean_link(url):
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc, parts.path or "/", parts.query, ""))
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+# Yields ("url", loc) for pages and ("sitemap", loc) for the children of a
+# sitemap index, parsing the XML as it is downloaded. With a politeness the
+# request follows robots.txt and waits for its host's rate limit.
+def iter_sitemap(client, url, politeness=None):
+    if politeness is not None:
+        blocked = politeness.robots_block(client, url)
+        if blocked:
+            raise SkippedResponse(blocked)
+        politeness.pace(url)
+    response = client.get(url, stream=True)
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        source = response.raw
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if urlsplit(url).path.endswith(".gz") or content_type in GZIP_CONTENT_TYPES:
+            source = gzip.GzipFile(fileobj=source)
+        root = None
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end":
+                continue
+            kind = _local_name(elem.tag)
+            if kind in ("url", "sitemap"):
+                loc = next((child.text for child in elem if _local_name(child.tag) == "loc" and child.text), None)
+                if loc:
+                    yield kind, loc.strip()
+                # Drop finished entries so a 50k-URL sitemap isn't kept as a tree
+                root.clear()
+    finally:
+        response.close()
+
+
+# Sitemaps listed in robots.txt (read through the shared robots cache), or
+# /sitemap.xml; a seed that is itself an .xml URL is used as is.
+def sitemap_candidates(client, seed):
+    parts = urlsplit(seed)
+    if parts.path.endswith((".xml", ".xml.gz")):
+        return [seed]
+    rules = get_robots_cache().rules(client, seed)
+    sitemaps = rules.site_maps() if rules is not None else None
+    return sitemaps or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+
+
+def extract_links(html, base_url):
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("a", href=True))
+    links = []
+    for a in soup.find_all("a"):
+        if "nofollow" in (a.get("rel") or []):
+            continue
+        link = clean_link(urljoin(base_url, a["href"]))
+        if link:
+            links.append(link)
+    return links
+
+
+# Returns up to max_urls page URLs in discovery order: the seeds that are
+# pages, then sitemap entries (following sitemap indexes), then links found
+# breadth-first on the same hosts as the seeds, max_depth levels deep.
+# on_skip(url, reason) is told about sitemaps and pages that could not be read.
+# With a politeness (politeness.Politeness) sitemap reads and the crawl are
+# paced per host and follow robots.txt. on_found(count) sees the number of
+# URLs found so far; once the cancel event is set the URLs found until then
+# are returned.
+def discover_urls(seeds, client=None, cache=None, use_sitemap=True, max_depth=0, max_urls=DEFAULT_MAX_URLS,
+                  frontier_size=DEFAULT_FRONTIER_SIZE, max_workers=8, max_per_host=2,
+                  max_bytes=DEFAULT_MAX_DOWNLOAD_BYTES, on_skip=None, politeness=None, on_found=None, cancel=None):
+    client = client or get_client()
+    seen = BloomFilter(capacity=max(max_urls, frontier_size) * 10)
+    found = []
+    frontier = deque()
+    # Set when max_urls is reached or the caller cancels
+    full = threading.Event()
+
+    def stopped():
+        if cancel is not None and cancel.is_set():
+            full.set()
+        return full.is_set()
+
+    def skip(url, reason):
+        if on_skip is not None:
+            on_skip(url, reason)
+
+    def add(url):
+        if len(found) >= max_urls:
+            full.set()
+            return
+        if url is None or not seen.add(url):
+            return
+        found.append(url)
+        if on_found is not None:
+            on_found(len(found))
+        # When the frontier is full the URL is still returned, just not crawled
+        if len(frontier) < frontier_size:
+            frontier.append(url)
+
+    seeds = [seed for seed in (clean_link(seed) for seed in seeds) if seed]
+    for seed in seeds:
+        if not urlsplit(seed).path.endswith((".xml", ".xml.gz")):
+            add(seed)
+
+    if use_sitemap:
+        sitemaps = deque(candidate for seed in seeds for candidate in sitemap_candidates(client, seed))
+        seen_sitemaps = set(sitemaps)
+        while sitemaps and not stopped():
+            sitemap_url = sitemaps.popleft()
+            try:
+                for kind, loc in iter_sitemap(client, sitemap_url, politeness):
+                    if kind == "sitemap":
+                        if loc not in seen_sitemaps and len(seen_sitemaps) < MAX_SITEMAPS:
+                            seen_sitemaps.add(loc)
+                            sitemaps.append(loc)
+                    else:
+                        add(clean_link(loc))
+                        if stopped():
+                            break
+            except (requests.RequestException, ET.ParseError, OSError, EOFError) as e:
+                skip(sitemap_url, f"sitemap not read: {e}")
+
+    hosts = {host_of(seed) for seed in seeds}
+
+    def links_of(url):
+        try:
+            return extract_links(fetch_body(url, client, cache, None, max_bytes, True, politeness), url)
+        except (requests.RequestException, ValueError) as e:
+            skip(url, f"not crawled: {e}")
+            return []
+
+    def collect(idx, links, done, total):
+        if stopped():
+            return
+        for link in links:
+            if host_of(link) in hosts:
+                add(link)
+
+    for _ in range(max_depth):
+        if not frontier or stopped():
+            break
+        level = list(frontier)
+        frontier.clear()
+        fetch_concurrently(level, links_of, max_workers, max_per_host, collect, keep_results=False, cancel=full,
+                          scheduler=politeness)
+    return found
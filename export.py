@@ -0,0 +1,151 @@
+import hashlib
+import io
+import json
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from importlib.util import find_spec
+from urllib.parse import urlsplit
+
+# Exports larger than this roll over from memory to a temporary file on disk
+SPOOL_MEMORY_BYTES = 1024 * 1024
+PREVIEW_CHARS = 20_000
+
+
+# Markdown export written incrementally to a spooled temporary file. Results
+# handed over with put() may arrive in any order; they are written as soon as
+# every earlier result is in. Only the first PREVIEW_CHARS characters are kept
+# in memory for display.
+class MarkdownSpool:
+    def __init__(self, max_memory=SPOOL_MEMORY_BYTES, preview_chars=PREVIEW_CHARS):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+b", suffix=".md")
+        self.size = 0
+        self.chars = 0
+        self.preview_chars = preview_chars
+        self._preview = []
+        self._preview_len = 0
+        self._pending = {}
+        self._next = 0
+
+    def write(self, text):
+        room = self.preview_chars - self._preview_len
+        if room > 0:
+            self._preview.append(text[:room])
+            self._preview_len += len(self._preview[-1])
+        data = text.encode()
+        self.file.write(data)
+        self.size += len(data)
+        self.chars += len(text)
+
+    def put(self, index, text):
+        self._pending[index] = text
+        while self._next in self._pending:
+            self.write(self._pending.pop(self._next))
+            self._next += 1
+
+    # Writes whatever is still waiting for an earlier result (e.g. after a
+    # cancelled run), in order
+    def flush(self):
+        for index in sorted(self._pending):
+            self.write(self._pending.pop(index))
+        self._next = 0
+
+    def preview(self):
+        return "".join(self._preview)
+
+    @property
+    def truncated(self):
+        return self.chars > self.preview_chars
+
+    def read_bytes(self):
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0, 2)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def output_file_name(url):
+    parts = urlsplit(url)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', f"{parts.netloc}{parts.path}").strip('-')[:80]
+    digest = hashlib.sha1(url.encode()).hexdigest()[:8]
+    return f"{slug}-{digest}.md"
+
+
+def available_archive_formats():
+    formats = ['zip']
+    if find_spec('zstandard') is not None:
+        formats.append('tar.zst')
+    return formats
+
+
+# Archive with one Markdown file per URL under pages/ and a manifest.json of
+# url, file, status and bytes. Pages are compressed into a spooled temporary
+# file as they are added (from any thread); close() writes the manifest.
+class ArchiveWriter:
+    def __init__(self, archive_format='zip', max_memory=SPOOL_MEMORY_BYTES):
+        self.format = archive_format
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+b")
+        self.manifest = []
+        self.closed = False
+        self._lock = threading.Lock()
+        if archive_format == 'tar.zst':
+            import zstandard
+            self._flush_frame = zstandard.FLUSH_FRAME
+            self._zstd = zstandard.ZstdCompressor().stream_writer(self.file, closefd=False)
+            self._tar = tarfile.open(fileobj=self._zstd, mode="w|")
+        else:
+            self._zip = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED)
+
+    def _write(self, name, data):
+        if self.format == 'tar.zst':
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+        else:
+            self._zip.writestr(name, data)
+
+    # markdown_text may be None (or empty) for URLs without output
+    def add(self, url, status, markdown_text):
+        data = markdown_text.encode() if markdown_text else b""
+        name = f"pages/{output_file_name(url)}" if data else None
+        with self._lock:
+            if self.closed:
+                return
+            if name:
+                self._write(name, data)
+            self.manifest.append({"url": url, "file": name, "status": status, "bytes": len(data)})
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self._write("manifest.json", json.dumps(self.manifest, ensure_ascii=False, indent=1).encode())
+            if self.format == 'tar.zst':
+                self._tar.close()
+                self._zstd.flush(self._flush_frame)
+            else:
+                self._zip.close()
+            self.closed = True
+
+    def read_bytes(self):
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0, 2)
+        return data
+
+    # Copies the closed archive to fileobj without reading it into memory
+    def copy_to(self, fileobj):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, fileobj)
+        self.file.seek(0, 2)
+
+    def discard(self):
+        self.file.close()
@@ -0,0 +1,67 @@
+from importlib.util import find_spec
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
+
+from profiles import compile_selectors
+
+# "single_pass" walks the document once and keeps only the outermost matching
+# elements; "per_tag" is the original behaviour (one find_all per tag, so
+# nested matches are emitted again for every selected tag).
+EXTRACTION_MODES = ['single_pass', 'per_tag']
+
+
+def available_parsers():
+    parsers = ['html.parser']
+    if find_spec('lxml') is not None:
+        parsers.append('lxml')
+    return parsers
+
+
+def parse_html(html, tags, mode='single_pass', parser='html.parser', use_strainer=False):
+    # With a strainer the parser only builds the selected tags and their subtrees
+    parse_only = SoupStrainer(list(set(tags))) if use_strainer and mode != 'per_tag' else None
+    return BeautifulSoup(html, parser, parse_only=parse_only)
+
+
+def select_fragments(soup, tags, mode='single_pass'):
+    if mode == 'per_tag':
+        return "".join(str(element) for tag in tags for element in soup.find_all(tag))
+
+    wanted = set(tags)
+    fragments = []
+    stack = list(reversed(soup.contents))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, Tag):
+            continue
+        if node.name in wanted:
+            # Outermost match: its subtree is emitted once and not searched again
+            fragments.append(str(node))
+            continue
+        stack.extend(reversed(node.contents))
+    return "".join(fragments)
+
+
+# Drops elements inside an earlier one; select() returns document order
+def outermost(elements):
+    chosen = set()
+    kept = []
+    for element in elements:
+        if not any(id(parent) in chosen for parent in element.parents):
+            chosen.add(id(element))
+            kept.append(element)
+    return kept
+
+
+# selectors is (include, exclude) from a profile (see profiles.py): exclude
+# matches are removed first, then the outermost include matches are kept, or
+# the tags when include is empty
+def select_content(soup, tags, mode='single_pass', selectors=None):
+    include, exclude = selectors or ((), ())
+    if exclude:
+        for element in outermost(compile_selectors(exclude).select(soup)):
+            element.decompose()
+    if not include:
+        return select_fragments(soup, tags, mode)
+    return "".join(str(element) for element in outermost(compile_selectors(include).select(soup)))
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+# Runs fetch(url) in parallel with a global worker cap and a per-host cap.
+# Results come back in the original URL order; on_result is called from the
+# calling thread as each URL finishes, so it is safe to touch Streamlit there.
+# With keep_results=False results are only handed to on_result, not collected.
+# Once the cancel event is set no new URLs start; their results stay None.
+# A scheduler (see politeness.Politeness) paces hosts: a host whose
+# try_acquire(host, url) fails is passed over until its ready_at() while the other
+# hosts keep the workers busy.
+def fetch_concurrently(urls, fetch, max_workers=8, max_per_host=2, on_result=None, keep_results=True, cancel=None,
+                       scheduler=None):
+    urls = list(urls)
+    total = len(urls)
+    results = [None] * total
+    max_workers = max(1, int(max_workers))
+    max_per_host = max(1, int(max_per_host))
+
+    queues = OrderedDict()
+    for idx, url in enumerate(urls):
+        queues.setdefault(host_of(url), deque()).append((idx, url))
+
+    active = {}
+    running = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queues or running:
+            if cancel is not None and cancel.is_set():
+                queues.clear()
+                if not running:
+                    break
+            # Hand out free slots to hosts in round-robin order
+            for host in list(queues):
+                pending = queues[host]
+                while pending and len(running) < max_workers and active.get(host, 0) < max_per_host:
+                    if scheduler is not None and not scheduler.try_acquire(host, pending[0][1]):
+                        break
+                    idx, url = pending.popleft()
+                    running[executor.submit(fetch, url)] = (idx, host)
+                    active[host] = active.get(host, 0) + 1
+                if not pending:
+                    del queues[host]
+                if len(running) >= max_workers:
+                    break
+
+            timeout = None
+            # Hosts held back by max_per_host wait for a fetch to finish instead
+            paced = [host for host in queues if active.get(host, 0) < max_per_host]
+            if scheduler is not None and paced and len(running) < max_workers:
+                timeout = max(0.01, min(scheduler.ready_at(host) for host in paced) - time.monotonic())
+                if not running:
+                    time.sleep(timeout)
+                    continue
+            finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx, host = running.pop(future)
+                active[host] -= 1
+                result = future.result()
+                if keep_results:
+                    results[idx] = result
+                done += 1
+                if on_result:
+                    on_result(idx, result, done, total)
+    return results
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Process-wide pool for CPU-bound work (parsing and html2text). Workers are
+# spawned rather than forked because the Streamlit server is multi-threaded.
+# It is sized once, for all cores or the first workers asked for if more,
+# since other sessions' jobs may be using it; see PoolSlots for per-run limits.
+def get_process_pool(workers=None):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = max(available_cores(), int(workers or 0))
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return _process_pool
+
+
+# Forgets a pool whose workers died, so the next get_process_pool builds a new one
+def reset_process_pool(pool):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+
+
+# Lets one run have at most workers jobs in the shared pool at a time; submit()
+# blocks until one of them finishes. A broken pool is replaced for later jobs.
+class PoolSlots:
+    def __init__(self, workers):
+        self.workers = max(1, int(workers))
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def submit(self, fn, *args):
+        self._slots.acquire()
+        pool = get_process_pool(self.workers)
+
+        def done(future):
+            self._slots.release()
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                reset_process_pool(pool)
+
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                reset_process_pool(pool)
+            raise
+        future.add_done_callback(done)
+        return future
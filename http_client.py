@@ -0,0 +1,197 @@
+import codecs
+import re
+from http.cookiejar import DefaultCookiePolicy
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_POOL_SIZE = 10
+# Number of per-host connection pools kept alive by each client
+MAX_HOST_POOLS = 100
+USER_AGENT = "Mozilla/5.0 (compatible; streamlit-md)"
+# Largest body read per page (after decompression); bigger pages are skipped
+DEFAULT_MAX_DOWNLOAD_BYTES = 10 * 1024 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# How much of the body is searched for a <meta charset> declaration
+CHARSET_SNIFF_BYTES = 4096
+CHUNK_SIZE = 64 * 1024
+
+_meta_charset = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9._:-]+)', re.IGNORECASE)
+
+
+_timings = threading.local()
+
+
+# Connections that add the time spent in connect() (TCP, plus TLS for https)
+# to a per-thread counter, so each request can report its connect time.
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timings.connect = getattr(_timings, "connect", 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timings.connect = getattr(_timings, "connect", 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+# Raised instead of downloading a page that can't or shouldn't be converted
+# (wrong content type, too large); the message is the reason.
+class SkippedResponse(requests.RequestException):
+    pass
+
+
+def is_html(content_type):
+    # A missing Content-Type is let through and left to the parser
+    if not content_type:
+        return True
+    return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+# Raises SkippedResponse when a successful response is not HTML or its size
+# (in bytes, if known) is over max_bytes.
+def check_response(response, max_bytes=None, html_only=False, size=None):
+    if not response.ok:
+        return
+    if html_only and not is_html(response.headers.get("Content-Type")):
+        raise SkippedResponse(f"not HTML ({response.headers['Content-Type']})", response=response)
+    if max_bytes and size is not None and size > max_bytes:
+        raise SkippedResponse(f"larger than {max_bytes:,} bytes ({size:,} bytes)", response=response)
+
+
+# Reads a stream=True response into response.content, checking the headers
+# first so junk links are dropped before their body is downloaded.
+def read_limited(response, max_bytes=None, html_only=False):
+    try:
+        # Content-Length counts compressed bytes, so it is only a lower bound
+        length = response.headers.get("Content-Length", "")
+        check_response(response, max_bytes, html_only, int(length) if length.isdigit() else None)
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise SkippedResponse(f"larger than {max_bytes:,} bytes", response=response)
+            chunks.append(chunk)
+    except BaseException:
+        # Drops the connection instead of draining the rest of the body
+        response.close()
+        raise
+    response._content = b"".join(chunks)
+    return response
+
+
+# Only text encodings: codecs.lookup also knows base64, hex, rot13, zlib...
+def _charset(name):
+    try:
+        info = codecs.lookup(name.strip())
+    except (LookupError, ValueError):
+        return None
+    return info.name if getattr(info, "_is_text_encoding", True) else None
+
+def detect_charset(content, content_type=None):
+    for param in (content_type or "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            charset = _charset(value.strip('"\' '))
+            if charset:
+                return charset
+    if content.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    match = _meta_charset.search(content, 0, CHARSET_SNIFF_BYTES)
+    if match:
+        return _charset(match.group(1).decode("ascii"))
+    return None
+
+# Decodes the body once with the charset from the headers, a BOM or a
+# <meta charset>; undeclared pages are tried as UTF-8, then windows-1252.
+def decode_body(content, content_type=None):
+    charset = detect_charset(content, content_type)
+    if charset:
+        return content.decode(charset, errors="replace")
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("cp1252", errors="replace")
+
+
+# Shared HTTP client: one keep-alive connection pool per host, compressed
+# responses (br/zstd are advertised only when urllib3 can decode them) and
+# connect/read timeouts so a stalled server can't hang the whole run. Every
+# user and job shares it, so its cookie jar accepts nothing: cookies only
+# live for one request and its redirects.
+class HttpClient:
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Connection": "keep-alive",
+        })
+        adapter = TimedHTTPAdapter(pool_connections=MAX_HOST_POOLS, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # The response carries connect_time: seconds spent opening new connections
+    # for it (0 when a kept-alive connection was reused). With max_bytes or
+    # html_only the body is streamed and checked (see read_limited).
+    def get(self, url, max_bytes=None, html_only=False, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        limited = bool(max_bytes or html_only)
+        if limited:
+            kwargs["stream"] = True
+        _timings.connect = 0.0
+        response = self.session.get(url, **kwargs)
+        response.connect_time = _timings.connect
+        if limited:
+            read_limited(response, max_bytes, html_only)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Returns the process-wide client for this configuration, so every project
+# with the same settings reuses the same warm connections.
+def get_client(connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+    key = (float(connect_timeout), float(read_timeout), int(pool_size))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = HttpClient(*key)
+        return client
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+import streamlit as st
+
+from jobs import get_job
+
+
+# Polls the job once a second as a fragment, so only the progress bar reruns;
+# the whole app reruns once the job is over to show its output
+@st.fragment(run_every=1)
+def show_job_progress(project):
+    job = get_job(project.id)
+    if job is None or not job.running:
+        st.rerun()
+    st.progress(job.fraction)
+    eta = job.eta_seconds()
+    time_left = f" - about {timedelta(seconds=round(eta))} left" if eta is not None else ""
+    st.caption(f"{job.done} of {job.total} URLs processed{time_left}")
+    if st.button("Cancel"):
+        job.cancel()
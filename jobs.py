@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Projects that can process at the same time across all sessions
+MAX_RUNNING_JOBS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix="md-job")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+# A processing run that lives outside the Streamlit script thread, so reruns
+# caused by widget interaction neither abort it nor wait for it. The UI polls
+# it for progress; results go to the store as each URL finishes.
+class Job:
+    def __init__(self, key, total, context=None):
+        self.key = key
+        self.total = total
+        self.context = context
+        self.done = 0
+        self.result = None
+        self.error = None
+        self.started = datetime.now()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    # Matches the on_result(idx, result, done, total) callback of fetch_concurrently
+    def record(self, idx, result, done, total):
+        self.done = done
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 1.0
+
+    def eta_seconds(self):
+        if not self.done:
+            return None
+        elapsed = (datetime.now() - self.started).total_seconds()
+        return elapsed / self.done * (self.total - self.done)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+
+def _run(job, target):
+    try:
+        job.result = target(job)
+    except Exception as e:
+        job.error = e
+    finally:
+        job.finished = datetime.now()
+
+
+# Starts target(job) in the background unless the key already has a running job
+def start_job(key, total, target, context=None):
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None and job.running:
+            return job
+        job = _jobs[key] = Job(key, total, context)
+        job.future = _executor.submit(_run, job, target)
+        return job
+
+
+def get_job(key):
+    with _jobs_lock:
+        return _jobs.get(key)
+
+
+def forget_job(key):
+    with _jobs_lock:
+        return _jobs.pop(key, None)
+
@@ -0,0 +1,66 @@
+import streamlit as st
+
+from metrics import metric_entries, url_table, host_table, log_to_csv, log_to_jsonl, log_to_prometheus
+from compact import format_time
+
+LOG_PAGE_SIZE = 100
+
+
+# Size of both cache tiers and what fetches got from them since the process
+# started, across all sessions
+def show_cache_stats(cache):
+    cached_entries, cached_bytes = cache.size()
+    memory_entries, memory_bytes = cache.memory_size()
+    st.caption(f"Response cache: {cached_entries} pages, {cached_bytes / 1_048_576:.1f} MB on disk; "
+               f"{memory_entries} pages, {memory_bytes / 1_048_576:.1f} MB in memory")
+    stats = cache.stats
+    st.caption(f"Shared fetches: {stats['shared']:,} memory hits, {stats['coalesced']:,} coalesced, "
+               f"{stats['hit'] + stats['revalidated']:,} disk hits, {stats['miss']:,} misses")
+
+
+def show_dedupe_stats(stats):
+    saved = stats['input_bytes'] - stats['output_bytes']
+    share = saved / stats['input_bytes'] if stats['input_bytes'] else 0.0
+    st.caption(f"Post-processing saved {saved:,} of {stats['input_bytes']:,} bytes ({share:.0%}): "
+               f"{stats['boilerplate_blocks']:,} boilerplate blocks ({stats['boilerplate_bytes']:,} bytes), "
+               f"{stats['near_duplicates']:,} near-duplicate pages ({stats['duplicate_bytes']:,} bytes dropped).")
+
+
+# Sortable per-host and per-URL metrics for the Log tab, plus exports
+def show_metrics(project):
+    if getattr(project, 'dedupe_stats', None):
+        show_dedupe_stats(project.dedupe_stats)
+    if getattr(project.log, 'dropped', 0):
+        st.caption(f"Showing the last {len(project.log):,} log entries; {project.log.dropped:,} older ones were dropped.")
+    if not metric_entries(project.log):
+        return
+    st.markdown("#### Hosts (slowest first)")
+    st.dataframe(host_table(project.log))
+    st.markdown("#### URLs")
+    st.caption("Click a column header to sort, e.g. by total time or response bytes.")
+    st.dataframe(url_table(project.log))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Export CSV", data=lambda: log_to_csv(project.log), file_name=f"{project.name}-log.csv", mime="text/csv", on_click="ignore")
+    with col2:
+        st.download_button("Export JSONL", data=lambda: log_to_jsonl(project.log), file_name=f"{project.name}-log.jsonl", mime="application/jsonl", on_click="ignore")
+    with col3:
+        st.download_button("Prometheus snapshot", data=lambda: log_to_prometheus(project.log, project.name), file_name=f"{project.name}-metrics.prom", mime="text/plain", on_click="ignore")
+
+
+# Metrics plus the log one page at a time, as a single text element per page.
+# A fragment: paging reruns only this part of the app.
+@st.fragment
+def show_log(project):
+    entries = list(project.log)
+    if not entries:
+        st.text("No log entries.")
+        return
+    show_metrics(project)
+    pages = (len(entries) + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE
+    page = pages
+    if pages > 1:
+        # The label changes with the page count, so a longer log opens on its last page
+        page = st.number_input(f"Log page (1-{pages})", min_value=1, max_value=pages, value=pages)
+    lines = entries[(page - 1) * LOG_PAGE_SIZE:page * LOG_PAGE_SIZE]
+    st.text("\n".join(f"{format_time(entry['time'])} - {entry['url']} - {entry['status']}" for entry in lines))
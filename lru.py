@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+
+# Thread-safe LRU mapping bounded by the total size of its values
+class LRUCache:
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._total -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._total += size
+            while self._total > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._total -= evicted
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value, size = self._data.pop(key)
+            self._total -= size
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def total(self):
+        return self._total
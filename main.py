@@ -1,108 +1,270 @@
 import streamlit as st
-import requests
-import html2text
-from bs4 import BeautifulSoup
-import base64
-from datetime import datetime, timedelta
-import re
-
-# Classe para gerenciar cada projeto
-class Project:
-    def __init__(self, name):
-        self.name = name
-        self.urls = ""
-        self.selected_tags = ['article']
-        self.markdown_output = ""
-        self.file_name = 'md-export.md'
-        self.ignore_links = True
-        self.ignore_images = True
-        self.log = []
-        self.urls_tags = {}
-
-def remove_duplicates(urls):
-    return list(dict.fromkeys(urls))
-
-def html_to_markdown(url, tags, ignore_links, ignore_images):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-        content = ""
-        for tag in tags:
-            for element in soup.find_all(tag):
-                content += str(element)
-
-        if not content:
-            return "No specified tags found in the HTML."
-
-        markdown_converter = html2text.HTML2Text()
-        markdown_converter.ignore_links = ignore_links
-        markdown_converter.ignore_images = ignore_images
-        markdown_text = markdown_converter.handle(content)
-
-        return markdown_text
-    except requests.RequestException as e:
-        return f"An error occurred: {e}"
-
-def process_urls(urls_tags, project):
-    combined_markdown = ""
-    for url, tags in urls_tags.items():
-        combined_markdown += html_to_markdown(url, tags, project.ignore_links, project.ignore_images) + "\n\n"
-    return combined_markdown
-
-def download_markdown(markdown_text, filename):
-    b64 = base64.b64encode(markdown_text.encode()).decode()
-    href = f'<a href="data:file/markdown;base64,{b64}" download="{filename}" target="_blank">Click here to download your markdown file</a>'
-    return href
+import time
+from pipeline import Project, process_urls, assemble_output, project_client, project_cache, project_deduper, project_politeness, conversion_options, collapse_entry, near_duplicate_entry, iter_chunks, archive_stored
+from fetcher import available_cores
+from response_cache import get_cache
+from extraction import available_parsers, EXTRACTION_MODES
+from substitution import URL_PATTERN
+from export import MarkdownSpool, ArchiveWriter, available_archive_formats, output_file_name, PREVIEW_CHARS
+from log_view import show_log, show_cache_stats
+from job_view import show_job_progress
+from jobs import start_job, get_job, forget_job
+from store import get_store, owner_key, DONE, FAILED, PENDING, SKIPPED
+from discovery import discover_urls
+from canonical import dedupe_urls
+from boilerplate import NEAR_DUPLICATE_MODES
+from chunking import available_token_counters, chunks_to_jsonl
+from compact import session_nbytes
+from profiles import match_profile
+from profile_view import show_profiles
 
 def clear_project_data(project):
     project.urls = ""
     project.selected_tags = ['article']
     project.markdown_output = ""
-    project.log = []
+    project.log.clear()
     project.urls_tags = {}
+    if project.output_spool is not None:
+        project.output_spool.close()
+        project.output_spool = None
+    get_store().set_urls(project.id, {})
+    get_store().clear_log(project.id)
+
+def show_spooled_output(project):
+    spool = project.output_spool
+    st.markdown("## Markdown Output")
+    st.text_area("Markdown (preview)", spool.preview(), height=400)
+    if spool.truncated:
+        st.caption(f"Showing the first {spool.preview_chars:,} of {spool.chars:,} characters ({spool.size / 1_048_576:.1f} MB).")
+    project.file_name = st.text_input("Enter the name of the file to save:", project.file_name)
+    if project.file_name:
+        st.download_button("Download markdown file", data=spool.read_bytes, file_name=project.file_name, mime="text/markdown", on_click="ignore")
+    show_exports(project)
+
+def build_archive(project):
+    archive = archive_stored(get_store(), project.id, ArchiveWriter(project.archive_format))
+    archive.close()
+    try:
+        return archive.read_bytes()
+    finally:
+        archive.discard()
+
+# Downloads besides the combined file; payloads are only built when clicked,
+# so runs don't pay for an archive nobody downloads
+def show_exports(project):
+    extension = ".tar.zst" if project.archive_format == 'tar.zst' else ".zip"
+    st.download_button(f"Download archive ({extension})", data=lambda: build_archive(project),
+                       file_name=f"{project.name}{extension}", on_click="ignore")
+    # One JSON line per chunk of at most chunk_tokens tokens, with its source URL
+    st.download_button(f"Download chunks (JSONL, {project.chunk_tokens} tokens each)", data=lambda: chunks_to_jsonl(iter_chunks(get_store(), project)),
+                       file_name=f"{project.name}-chunks.jsonl", mime="application/jsonl", on_click="ignore")
+    urls = [url for url in project.urls_tags]
+    if urls:
+        url = st.selectbox("Single page", urls)
+        st.download_button("Download page", data=lambda: get_store().result(project.id, url) or "",
+                           file_name=output_file_name(url), mime="text/markdown", on_click="ignore")
+
+def collapse_logger(project):
+    def log_collapse(url, kept, reason):
+        log_entry = collapse_entry(url, kept, reason)
+        project.log.append(log_entry)
+        get_store().append_log(project.id, log_entry)
+    return log_collapse
+
+def discovery_key(project):
+    return f"{project.id}:discover"
+
+# Discovery is a background job too, since a crawl can take long; the URLs it
+# finds are added to the project by finish_discovery, in the script thread
+def start_discovery(project, seed, tags, use_sitemap, max_depth, max_urls):
+    client, cache, politeness = project_client(project), project_cache(project), project_politeness(project)
+
+    def log_skip(url, reason):
+        project.log.append({"url": url, "time": time.time(), "status": f"Skipped: {reason}"})
+
+    def target(job):
+        def on_found(count):
+            job.done = count
+        return discover_urls([seed], client, cache, use_sitemap, max_depth, max_urls,
+                             max_workers=project.max_workers, max_per_host=project.max_per_host,
+                             max_bytes=project.max_download_bytes, on_skip=log_skip, politeness=politeness,
+                             on_found=on_found, cancel=job.cancel_event)
+    return start_job(discovery_key(project), max_urls, target, context=tags)
+
+@st.fragment(run_every=1)
+def show_discovery_progress(project):
+    job = get_job(discovery_key(project))
+    if job is None or not job.running:
+        st.rerun()
+    st.caption(f"Discovering URLs: {job.done} found so far (max {job.total})")
+    if st.button("Stop discovery"):
+        job.cancel()
+
+# Adds the URLs found to the URL list and to urls_tags, so they can be
+# processed right away
+def finish_discovery(project, job):
+    forget_job(discovery_key(project))
+    if job.error is not None:
+        st.error(f"Discovery failed: {job.error}")
+        return
+    discovered = job.result
+    new_urls = [url for url in discovered if url not in project.urls_tags]
+    for url in new_urls:
+        project.urls_tags[url] = job.context
+    if new_urls:
+        project.urls = "\n".join([project.urls.rstrip(), *new_urls]).lstrip()
+        get_store().set_urls(project.id, project.urls_tags, conversion_options(project, project.urls_tags))
+    stopped = " (stopped early)" if job.cancelled else ""
+    st.success(f"Found {len(discovered)} URLs, {len(new_urls)} new{stopped}.")
+
+# Brings urls_tags and the store in line with the URL text before a run. New
+# URLs get the selected tags and the others keep theirs; removed URLs are
+# dropped with their results and URLs whose tags or conversion options
+# changed become pending, so only those are fetched. Returns the counts from
+# ProjectStore.set_urls.
+def sync_urls(project):
+    unique_urls, _ = dedupe_urls(URL_PATTERN.findall(project.urls), collapse_logger(project))
+    project.urls_tags = {url: project.urls_tags.get(url, project.selected_tags) for url in unique_urls}
+    return get_store().set_urls(project.id, project.urls_tags, conversion_options(project, project.urls_tags))
+
+def show_changes(changes):
+    st.caption(f"Since the last run: {changes['added']} new, {changes['changed']} changed, {changes['removed']} removed, "
+               f"{changes['unchanged']} unchanged URLs")
+
+# Processing runs as a background job keyed by project, so it survives reruns.
+# Only URLs that are not done yet in the store are processed.
+def start_processing(project):
+    store = get_store()
+    urls_tags = store.pending_urls(project.id)
+    target = lambda job: process_urls(urls_tags, project, job=job, store=store)
+    return start_job(project.id, len(urls_tags), target)
+
+# Builds the output from every stored result, not only the last run's
+def load_output(project):
+    if project.output_spool is not None:
+        project.output_spool.close()
+        project.output_spool = None
+    deduper = project_deduper(project)
+    log_duplicate = lambda url, original: project.log.append(near_duplicate_entry(url, original, project.near_duplicates == 'drop'))
+    if project.stream_export:
+        project.output_spool = assemble_output(get_store(), project.id, MarkdownSpool(), deduper, log_duplicate)
+        project.output_spool.flush()
+        project.markdown_output = ""
+    else:
+        project.markdown_output = assemble_output(get_store(), project.id, None, deduper, log_duplicate)
+    project.dedupe_stats = deduper.stats if deduper is not None else None
+
+# A fragment: the file name and the export widgets rerun only this part. The
+# preview is capped and the downloads are built when clicked.
+@st.fragment
+def show_output(project):
+    if project.output_spool is not None:
+        show_spooled_output(project)
+        return
+    st.markdown("## Markdown Output")
+    preview, truncated = project.markdown_preview(PREVIEW_CHARS)
+    st.text_area("Markdown", preview, height=400)
+    if truncated:
+        st.caption(f"Showing the first {PREVIEW_CHARS:,} characters; the download has all of them.")
+    project.file_name = st.text_input("Enter the name of the file to save:", project.file_name)
+    if project.file_name:
+        st.download_button("Download markdown file", data=lambda: project.markdown_output.encode(), file_name=project.file_name,
+                           mime="text/markdown", on_click="ignore")
+    show_exports(project)
+
+def finish_processing(project, job):
+    forget_job(project.id)
+    if job.error is not None:
+        st.error(f"Processing failed: {job.error}")
+        return
+    load_output(project)
+    if job.cancelled:
+        st.warning(f"Cancelled after {job.done} of {job.total} URLs; the rest stay pending and run on the next Process Content.")
 
 def main():
     st.sidebar.title("Projects")
     session_state = st.session_state
 
+    store = get_store()
+    owner = owner_key(st.query_params)
     if 'projects' not in session_state:
-        session_state.projects = [Project("Project 1")]
+        session_state.projects = store.load_projects(Project, owner) or [Project("Project 1")]
 
     if st.sidebar.button("Add New Project"):
         new_project_name = f"Project {len(session_state.projects) + 1}"
         session_state.projects.append(Project(new_project_name))
         session_state.current_project = session_state.projects[-1]
+        store.save_project(session_state.current_project, len(session_state.projects) - 1, owner)
 
     project_names = [project.name for project in session_state.projects]
     selected_project_name = st.sidebar.selectbox("Select a Project", project_names, index=0)
+    for project in session_state.projects:
+        project_job = get_job(project.id)
+        if project_job is not None and project_job.running:
+            st.sidebar.caption(f"{project.name}: {project_job.done}/{project_job.total} URLs")
+    st.sidebar.caption(f"Session memory: about {session_nbytes(session_state.projects) / 1_048_576:.1f} MB")
     session_state.current_project = next((project for project in session_state.projects if project.name == selected_project_name), None)
 
     st.title(session_state.current_project.name)
     html_tags = ['article', 'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'section', 'header', 'footer', 'ul', 'ol', 'li']
     selected_tags = st.multiselect("Select HTML tags to convert:", html_tags, default=session_state.current_project.selected_tags)
+    with st.expander("Discover URLs"):
+        seed = st.text_input("Site or sitemap URL")
+        use_sitemap = st.checkbox("Read sitemap.xml", value=True)
+        crawl_depth = st.number_input("Follow same-site links (depth, 0 = off)", min_value=0, max_value=10, value=0)
+        max_urls = st.number_input("Max URLs", min_value=1, max_value=100_000, value=1000)
+        discovery = get_job(discovery_key(session_state.current_project))
+        if st.button("Discover") and seed and not (discovery and discovery.running):
+            discovery = start_discovery(session_state.current_project, seed, selected_tags, use_sitemap, crawl_depth, max_urls)
+        if discovery is not None:
+            if discovery.running:
+                show_discovery_progress(session_state.current_project)
+            else:
+                finish_discovery(session_state.current_project, discovery)
     urls_input = st.text_area("Enter URLs (one per line):", session_state.current_project.urls, height=150)
     ignore_links = st.checkbox("Ignore Links", value=session_state.current_project.ignore_links)
     ignore_images = st.checkbox("Ignore Images", value=session_state.current_project.ignore_images)
+    session_state.current_project.selected_tags = selected_tags
+    session_state.current_project.urls = urls_input
+    session_state.current_project.ignore_links = ignore_links
+    session_state.current_project.ignore_images = ignore_images
 
     if st.button("Process Links"):
-        urls = re.findall(r'https?://[^\s)\]]+', urls_input)
-        unique_urls = remove_duplicates(urls)
+        urls = URL_PATTERN.findall(urls_input)
+        unique_urls, _ = dedupe_urls(urls, collapse_logger(session_state.current_project))
         session_state.current_project.urls_tags = {url: selected_tags for url in unique_urls}
         for url in unique_urls:
-            st.text(url)
+            profile = match_profile(url, session_state.current_project.profiles)
+            st.text(f"{url} (profile: {profile['name']})" if profile else url)
             session_state.current_project.urls_tags[url] = st.multiselect(f"Select tags for {url}:", html_tags, default=selected_tags)
+        store.set_urls(session_state.current_project.id, session_state.current_project.urls_tags, conversion_options(session_state.current_project, unique_urls))
 
-    if st.button("Process Content"):
-        session_state.current_project.markdown_output = process_urls(session_state.current_project.urls_tags, session_state.current_project)
-        st.markdown("## Markdown Output")
-        st.text_area("Markdown", session_state.current_project.markdown_output, height=400)
+    counts = store.status_counts(session_state.current_project.id)
+    if counts:
+        st.caption(f"Stored URLs: {counts.get(DONE, 0)} done, {counts.get(FAILED, 0)} failed, {counts.get(SKIPPED, 0)} skipped, {counts.get(PENDING, 0)} pending")
+    job = get_job(session_state.current_project.id)
+    if st.button("Process Content") and not (job and job.running):
+        show_changes(sync_urls(session_state.current_project))
+        job = start_processing(session_state.current_project)
+    if counts.get(DONE) and not (job and job.running):
+        if st.button("Reprocess All"):
+            sync_urls(session_state.current_project)
+            store.reset(session_state.current_project.id)
+            job = start_processing(session_state.current_project)
+        elif session_state.current_project.output_spool is None and not session_state.current_project.has_markdown_output and job is None:
+            if st.button("Load Stored Results"):
+                load_output(session_state.current_project)
+    if job is not None:
+        if job.running:
+            show_job_progress(session_state.current_project)
+        else:
+            finish_processing(session_state.current_project, job)
 
-        session_state.current_project.file_name = st.text_input("Enter the name of the file to save:", session_state.current_project.file_name)
-        if session_state.current_project.file_name:
-            download_link = download_markdown(session_state.current_project.markdown_output, session_state.current_project.file_name)
-            st.markdown(download_link, unsafe_allow_html=True)
+    if session_state.current_project.output_spool is not None or session_state.current_project.has_markdown_output:
+        show_output(session_state.current_project)
+
+    with st.expander("Extraction Profiles"):
+        show_profiles(session_state.current_project)
 
     with st.expander("Project Config"):
         new_name = st.text_input("Rename Project", value=session_state.current_project.name)
@@ -111,9 +273,42 @@ def main():
             project_names[project_names.index(selected_project_name)] = new_name
             st.experimental_rerun()
 
+        session_state.current_project.max_workers = st.number_input("Max parallel downloads", min_value=1, max_value=64, value=session_state.current_project.max_workers)
+        session_state.current_project.max_per_host = st.number_input("Max parallel downloads per host", min_value=1, max_value=16, value=session_state.current_project.max_per_host)
+        session_state.current_project.cpu_workers = st.number_input("Worker processes for parsing (0 = off)", min_value=0, max_value=available_cores(), value=min(session_state.current_project.cpu_workers, available_cores()))
+        session_state.current_project.connect_timeout = st.number_input("Connect timeout (seconds)", min_value=1.0, max_value=120.0, value=float(session_state.current_project.connect_timeout))
+        session_state.current_project.read_timeout = st.number_input("Read timeout (seconds)", min_value=1.0, max_value=600.0, value=float(session_state.current_project.read_timeout))
+        session_state.current_project.host_rate = st.number_input("Max requests per second per host", min_value=0.1, max_value=100.0, value=float(session_state.current_project.host_rate))
+        session_state.current_project.host_burst = st.number_input("Burst of requests per host", min_value=1, max_value=100, value=session_state.current_project.host_burst)
+        session_state.current_project.max_retries = st.number_input("Retries after 429/5xx or connection errors", min_value=0, max_value=10, value=session_state.current_project.max_retries)
+        session_state.current_project.respect_robots = st.checkbox("Respect robots.txt", value=session_state.current_project.respect_robots)
+
+        session_state.current_project.use_cache = st.checkbox("Use response cache", value=session_state.current_project.use_cache)
+        show_cache_stats(get_cache())
+        if st.button("Clear Response Cache"):
+            get_cache().clear()
+
+        session_state.current_project.extraction_mode = st.selectbox("Extraction mode", EXTRACTION_MODES, index=EXTRACTION_MODES.index(session_state.current_project.extraction_mode))
+        parsers = available_parsers()
+        session_state.current_project.parser = st.selectbox("HTML parser", parsers, index=parsers.index(session_state.current_project.parser) if session_state.current_project.parser in parsers else 0)
+        session_state.current_project.use_strainer = st.checkbox("Parse only the selected tags", value=session_state.current_project.use_strainer)
+        session_state.current_project.stream_export = st.checkbox("Stream export to a temporary file (preview only)", value=session_state.current_project.stream_export)
+        session_state.current_project.strip_boilerplate = st.checkbox("Strip blocks repeated on most pages of a host", value=session_state.current_project.strip_boilerplate)
+        archive_formats = available_archive_formats()
+        session_state.current_project.archive_format = st.selectbox("Archive format", archive_formats, index=archive_formats.index(session_state.current_project.archive_format) if session_state.current_project.archive_format in archive_formats else 0)
+        session_state.current_project.chunk_tokens = st.number_input("Chunk size for the chunked export (tokens)", min_value=32, max_value=100_000, value=session_state.current_project.chunk_tokens)
+        token_counters = available_token_counters()
+        session_state.current_project.token_counter = st.selectbox("Token counter", token_counters, index=token_counters.index(session_state.current_project.token_counter) if session_state.current_project.token_counter in token_counters else 0)
+        session_state.current_project.near_duplicates = st.selectbox("Near-duplicate pages", NEAR_DUPLICATE_MODES, index=NEAR_DUPLICATE_MODES.index(session_state.current_project.near_duplicates))
+        max_download_mb = st.number_input("Max download size per page (MB)", min_value=0.1, max_value=1024.0, value=session_state.current_project.max_download_bytes / 1_048_576)
+        session_state.current_project.max_download_bytes = int(max_download_mb * 1_048_576)
+        session_state.current_project.html_only = st.checkbox("Skip pages that are not HTML", value=session_state.current_project.html_only)
+
     with st.expander("Logs"):
-        for entry in session_state.current_project.log:
-            st.text(f"{entry['time']} - {entry['url']} - {entry['status']}")
+        show_log(session_state.current_project)
+
+    # Only the project on screen can have been edited
+    store.save_project(session_state.current_project, session_state.projects.index(session_state.current_project), owner)
 
 if __name__ == "__main__":
     main()
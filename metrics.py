@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from collections import defaultdict
+
+from fetcher import host_of
+
+# Per-URL metrics stored on each Project.log entry. Times are in seconds:
+# queue_wait is the wait before a worker picked the URL up, connect the time
+# spent opening new connections, ttfb the time until response headers
+# (connect included), download the rest of the fetch. parse, extract and
+# convert are 0 when the conversion memo already had the result. cache is
+# "hit", "revalidated", "shared", "coalesced", "miss" or "off" (see
+# response_cache.CachedResponse); retries counts the extra attempts after
+# 429/5xx responses and connection errors.
+METRIC_FIELDS = ['queue_wait', 'connect', 'ttfb', 'download', 'response_bytes', 'parse', 'extract', 'convert', 'output_bytes', 'cache', 'retries']
+TIME_FIELDS = ['queue_wait', 'connect', 'ttfb', 'download', 'parse', 'extract', 'convert']
+LOG_FIELDS = ['time', 'url', 'status'] + METRIC_FIELDS
+
+
+def new_metrics():
+    return dict.fromkeys(METRIC_FIELDS)
+
+
+def metric_entries(log):
+    return [entry for entry in log if 'response_bytes' in entry]
+
+
+# ttfb already includes connect
+def entry_seconds(entry):
+    return sum(entry.get(field) or 0.0 for field in TIME_FIELDS if field not in ('queue_wait', 'connect'))
+
+
+def url_table(log):
+    rows = []
+    for entry in metric_entries(log):
+        row = {field: entry.get(field) for field in LOG_FIELDS}
+        row['host'] = host_of(entry['url'])
+        row['total'] = entry_seconds(entry)
+        rows.append(row)
+    return rows
+
+
+def host_table(log):
+    hosts = defaultdict(lambda: {'urls': 0, 'errors': 0, 'total': 0.0, 'ttfb': 0.0, 'max_ttfb': 0.0,
+                                 'response_bytes': 0, 'output_bytes': 0, 'cache_hits': 0, 'retries': 0})
+    for entry in metric_entries(log):
+        row = hosts[host_of(entry['url'])]
+        row['urls'] += 1
+        if entry.get('status') != 'OK':
+            row['errors'] += 1
+        row['total'] += entry_seconds(entry)
+        ttfb = entry.get('ttfb') or 0.0
+        row['ttfb'] += ttfb
+        row['max_ttfb'] = max(row['max_ttfb'], ttfb)
+        row['response_bytes'] += entry.get('response_bytes') or 0
+        row['output_bytes'] += entry.get('output_bytes') or 0
+        if entry.get('cache') in ('hit', 'revalidated', 'shared', 'coalesced'):
+            row['cache_hits'] += 1
+        row['retries'] += entry.get('retries') or 0
+    table = []
+    for host, row in hosts.items():
+        table.append({'host': host, 'urls': row['urls'], 'errors': row['errors'],
+                      'total_seconds': row['total'], 'mean_ttfb': row['ttfb'] / row['urls'],
+                      'max_ttfb': row['max_ttfb'], 'response_bytes': row['response_bytes'],
+                      'output_bytes': row['output_bytes'], 'cache_hits': row['cache_hits'],
+                      'retries': row['retries']})
+    return sorted(table, key=lambda row: row['total_seconds'], reverse=True)
+
+
+def log_to_csv(log):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=LOG_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for entry in log:
+        writer.writerow(entry)
+    return buffer.getvalue()
+
+
+def log_to_jsonl(log):
+    return "".join(json.dumps({field: entry.get(field) for field in LOG_FIELDS if field in entry}) + "\n" for entry in log)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Snapshot of the project's metrics in the Prometheus text exposition format
+def log_to_prometheus(log, project_name):
+    entries = metric_entries(log)
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(val)}"' for key, val in [('project', project_name), *labels])
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    statuses = defaultdict(int)
+    caches = defaultdict(int)
+    for entry in entries:
+        statuses['ok' if entry.get('status') == 'OK' else 'error'] += 1
+        caches[entry.get('cache') or 'off'] += 1
+    metric("streamlit_md_urls_total", "counter", "URLs processed by result.", [([('status', status)], count) for status, count in sorted(statuses.items())])
+    metric("streamlit_md_stage_seconds_total", "counter", "Seconds spent per pipeline stage.",
+           [([('stage', field)], round(sum(entry.get(field) or 0.0 for entry in entries), 6)) for field in TIME_FIELDS])
+    metric("streamlit_md_response_bytes_total", "counter", "Response body bytes downloaded or read from cache.",
+           [([], sum(entry.get('response_bytes') or 0 for entry in entries))])
+    metric("streamlit_md_output_bytes_total", "counter", "Markdown bytes produced.",
+           [([], sum(entry.get('output_bytes') or 0 for entry in entries))])
+    metric("streamlit_md_cache_requests_total", "counter", "Response cache outcomes.", [([('result', result)], count) for result, count in sorted(caches.items())])
+    hosts = host_table(log)
+    metric("streamlit_md_host_seconds_total", "counter", "Seconds spent per host.", [([('host', row['host'])], round(row['total_seconds'], 6)) for row in hosts])
+    metric("streamlit_md_host_max_ttfb_seconds", "gauge", "Slowest time to first byte per host.", [([('host', row['host'])], round(row['max_ttfb'], 6)) for row in hosts])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,347 @@
+import json
+import time
+import uuid
+
+import requests
+from fetcher import fetch_concurrently, PoolSlots
+from http_client import get_client, check_response, decode_body, SkippedResponse, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_MAX_DOWNLOAD_BYTES
+from response_cache import get_cache
+from conversion import convert_body, convert_body_with_metrics, ConversionFailed
+from metrics import new_metrics
+from store import PENDING, DONE, FAILED, SKIPPED, DUPLICATE
+from canonical import AliasClaims, remember_alias, forget_alias, canonical_link, PERMANENT_REDIRECTS
+from boilerplate import ContentDeduper
+from chunking import chunk_markdown, get_token_counter, DEFAULT_CHUNK_TOKENS
+from compact import RunLog, pack_text, unpack_text, text_preview
+from profiles import match_profile, profile_selectors
+from politeness import Politeness, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_RETRIES
+
+# URL-to-Markdown pipeline shared by the Streamlit app and the batch CLI.
+# Nothing in here depends on Streamlit.
+
+# Classe para gerenciar cada projeto
+class Project:
+    # Many projects per session and many sessions per server: no per-instance dict
+    __slots__ = ('name', 'urls', 'selected_tags', '_markdown_output', 'file_name', 'ignore_links', 'ignore_images',
+                 'log', 'urls_tags', 'id', 'max_workers', 'max_per_host', 'connect_timeout', 'read_timeout',
+                 'use_cache', 'extraction_mode', 'parser', 'use_strainer', 'cpu_workers', 'stream_export',
+                 'output_spool', 'max_download_bytes', 'html_only', 'strip_boilerplate', 'near_duplicates',
+                 'dedupe_stats', 'archive_format', 'chunk_tokens', 'token_counter',
+                 'host_rate', 'host_burst', 'max_retries', 'respect_robots', 'profiles')
+
+    def __init__(self, name):
+        self.name = name
+        self.urls = ""
+        self.selected_tags = ['article']
+        self.markdown_output = ""
+        self.file_name = 'md-export.md'
+        self.ignore_links = True
+        self.ignore_images = True
+        self.log = RunLog()
+        self.urls_tags = {}
+        self.id = uuid.uuid4().hex
+        self.max_workers = 8
+        self.max_per_host = 2
+        self.connect_timeout = DEFAULT_CONNECT_TIMEOUT
+        self.read_timeout = DEFAULT_READ_TIMEOUT
+        self.use_cache = True
+        self.extraction_mode = 'single_pass'
+        self.parser = 'html.parser'
+        self.use_strainer = False
+        # Worker processes for parsing/conversion; 0 converts in the fetch threads
+        self.cpu_workers = 0
+        self.stream_export = False
+        self.output_spool = None
+        # Pages over this size or with a non-HTML Content-Type are skipped unread
+        self.max_download_bytes = DEFAULT_MAX_DOWNLOAD_BYTES
+        self.html_only = True
+        # Post-processing of the combined output (see boilerplate.py)
+        self.strip_boilerplate = False
+        self.near_duplicates = 'keep'
+        self.dedupe_stats = None
+        self.archive_format = 'zip'
+        # Chunked export (see chunking.py)
+        self.chunk_tokens = DEFAULT_CHUNK_TOKENS
+        self.token_counter = 'estimate'
+        # Per-host politeness (see politeness.py)
+        self.host_rate = DEFAULT_RATE
+        self.host_burst = DEFAULT_BURST
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.respect_robots = True
+        # Per-domain extraction profiles (see profiles.py)
+        self.profiles = []
+
+    # Held compressed; the per-URL results are in the store
+    @property
+    def markdown_output(self):
+        return unpack_text(self._markdown_output)
+
+    @markdown_output.setter
+    def markdown_output(self, text):
+        self._markdown_output = pack_text(text)
+
+    def markdown_preview(self, chars):
+        return text_preview(self._markdown_output, chars)
+
+    @property
+    def has_markdown_output(self):
+        return bool(self._markdown_output)
+
+def remove_duplicates(urls):
+    return list(dict.fromkeys(urls))
+
+def project_client(project):
+    return get_client(project.connect_timeout, project.read_timeout, project.max_per_host)
+
+def project_cache(project):
+    return get_cache() if project.use_cache else None
+
+def project_pool(project):
+    return PoolSlots(project.cpu_workers) if project.cpu_workers else None
+
+def project_deduper(project):
+    if not project.strip_boilerplate and project.near_duplicates == 'keep':
+        return None
+    return ContentDeduper(project.strip_boilerplate, project.near_duplicates)
+
+# Settings that change what a URL converts to; stored results made with
+# other values are redone on the next run. Fetch policy (size limit,
+# html_only, robots.txt) isn't among them: changing it doesn't redo pages.
+CONVERSION_OPTIONS = ['ignore_links', 'ignore_images', 'extraction_mode', 'parser', 'use_strainer']
+
+# {url: options string} for ProjectStore.set_urls: the conversion settings
+# plus the profile that applies to each URL, so editing one host's profile
+# only redoes that host's URLs
+def conversion_options(project, urls):
+    options = {name: getattr(project, name, None) for name in CONVERSION_OPTIONS}
+    return {url: json.dumps({**options, "profile": match_profile(url, project.profiles)}, sort_keys=True) for url in urls}
+
+# One per run: the retry budget scales with the number of URLs
+def project_politeness(project, total_urls=0):
+    return Politeness(project.host_rate, project.host_burst, project.max_retries, project.respect_robots, total_urls,
+                      cache=project_cache(project))
+
+# The optional metrics dict receives connect, ttfb, download, response_bytes
+# cache and retries (see metrics.py); download also covers writing to the
+# cache and waiting between retries.
+# Returns the decoded page; raises SkippedResponse for pages over max_bytes,
+# with html_only, with a non-HTML Content-Type and, with a politeness
+# (politeness.Politeness) that respects robots.txt, for disallowed pages.
+# An optional page dict receives "url": where the fetch landed, the final URL
+# or the page's rel=canonical.
+def fetch_body(url, client=None, cache=None, metrics=None, max_bytes=None, html_only=False, politeness=None, page=None):
+    client = client or get_client()
+    start = time.perf_counter()
+    before_request = (lambda: politeness.pace(url)) if politeness is not None else None
+
+    def get():
+        if cache:
+            response = cache.fetch(client, url, before_request, max_bytes=max_bytes, html_only=html_only)
+            if getattr(response, "from_cache", False):
+                # Stored under another project's limits
+                check_response(response, max_bytes, html_only, len(response.content))
+            return response
+        if before_request:
+            before_request()
+        return client.get(url, max_bytes=max_bytes, html_only=html_only)
+
+    if politeness is not None:
+        blocked = politeness.robots_block(client, url)
+        if blocked:
+            raise SkippedResponse(blocked)
+        response, retries = politeness.fetch(url, get)
+    else:
+        response, retries = get(), 0
+    if metrics is not None:
+        metrics["retries"] = retries
+        fetch_time = time.perf_counter() - start
+        ttfb = sum((r.elapsed.total_seconds() for r in [*response.history, response]), 0.0)
+        metrics["connect"] = getattr(response, "connect_time", 0.0)
+        metrics["ttfb"] = ttfb
+        metrics["download"] = max(0.0, fetch_time - ttfb)
+        metrics["response_bytes"] = len(response.content)
+        metrics["cache"] = getattr(response, "cache_status", "off")
+    response.raise_for_status()
+    text = decode_body(response.content, response.headers.get("Content-Type"))
+    # Later inputs that alias this page are collapsed before being fetched.
+    # Aliases this response contradicts are dropped; a cached page doesn't
+    # say how it was redirected, so its redirect is left as it was.
+    final_url = response.url or url
+    if final_url != url and response.history:
+        if all(r.status_code in PERMANENT_REDIRECTS for r in response.history):
+            remember_alias(url, final_url)
+        else:
+            forget_alias(url)
+    canonical = canonical_link(text, final_url)
+    if canonical:
+        remember_alias(final_url, canonical)
+    else:
+        forget_alias(final_url)
+    if page is not None:
+        page["url"] = canonical or final_url
+    return text
+
+# Raises requests.RequestException on fetch errors, ValueError when none
+# of the tags (or a profile's include selectors) are present and
+# ConversionFailed when a worker process fails. selectors come
+# from profiles.profile_selectors. With a process pool the fetch thread waits for its
+# conversion job, so at most one downloaded body per fetch thread is pending.
+def fetch_markdown(url, tags, ignore_links, ignore_images, client=None, cache=None, mode='single_pass', parser='html.parser', use_strainer=False, pool=None, metrics=None,
+                   max_bytes=None, html_only=False, politeness=None, selectors=None, page=None):
+    body = fetch_body(url, client, cache, metrics, max_bytes, html_only, politeness, page)
+    if pool is not None:
+        try:
+            markdown_text, cpu_metrics = pool.submit(convert_body_with_metrics, body, tags, ignore_links, ignore_images, mode, parser, use_strainer,
+                                                     selectors).result()
+        except ValueError:
+            raise
+        except Exception as e:
+            # A worker that died (BrokenProcessPool) or failed on this page
+            raise ConversionFailed(f"conversion worker failed: {e!r}") from e
+        if metrics is not None:
+            metrics.update(cpu_metrics)
+        return markdown_text
+    return convert_body(body, tags, ignore_links, ignore_images, mode, parser, use_strainer, metrics, selectors)
+
+# fetch_markdown with the project's settings; instead of raising, errors and
+# skipped pages become the page's text. Also appends a Project.log
+# entry with the status and per-stage metrics, and returns
+# (markdown_text, log_entry). queued is the perf_counter() value when the run
+# began; page is passed on to fetch_body.
+def logged_html_to_markdown(url, tags, project, client=None, cache=None, pool=None, queued=None, politeness=None, page=None):
+    log_entry = {"url": url, "time": time.time()}
+    metrics = new_metrics()
+    if queued is not None:
+        metrics["queue_wait"] = time.perf_counter() - queued
+    try:
+        markdown_text = fetch_markdown(url, tags, project.ignore_links, project.ignore_images, client, cache,
+                                       project.extraction_mode, project.parser, project.use_strainer, pool, metrics,
+                                       project.max_download_bytes, project.html_only, politeness,
+                                       profile_selectors(match_profile(url, project.profiles)), page)
+        log_entry["status"] = "OK"
+    except SkippedResponse as e:
+        log_entry["status"] = f"Skipped: {e}"
+        markdown_text = f"Skipped: {e}"
+    except requests.RequestException as e:
+        log_entry["status"] = f"Error: {e}"
+        markdown_text = f"An error occurred: {e}"
+    except ValueError as e:
+        log_entry["status"] = f"Error: {e}"
+        markdown_text = str(e)
+    except ConversionFailed as e:
+        log_entry["status"] = f"Error: {e}"
+        markdown_text = f"An error occurred: {e}"
+    log_entry.update(metrics)
+    project.log.append(log_entry)
+    return markdown_text, log_entry
+
+def collapse_entry(url, kept, reason):
+    return {"url": url, "time": time.time(), "status": f"Collapsed into {kept} ({reason})"}
+
+# Store status for a log status: skipped pages are not retried on resume
+def result_status(status):
+    if status == "OK":
+        return DONE
+    return SKIPPED if status.startswith("Skipped") else FAILED
+
+# Runs convert(url, tags) for every entry of urls_tags with the project's
+# concurrency limits; on_result(idx, result, done, total) sees each result.
+# Pass the run's politeness to pace the hosts.
+def convert_urls(urls_tags, project, convert, on_result=None, keep_results=True, cancel=None, politeness=None):
+    return fetch_concurrently(list(urls_tags), lambda url: convert(url, urls_tags[url]), project.max_workers, project.max_per_host, on_result, keep_results, cancel,
+                              politeness)
+
+# With out (e.g. a MarkdownSpool) each page is written in order as soon as it
+# is ready and out is returned; otherwise the combined string is returned.
+# A job (jobs.Job) receives every result and can cancel the run; pages that
+# never started are left out of the output. With a store (store.ProjectStore)
+# every result and log entry is persisted as it finishes and nothing is
+# returned; read the output back with assemble_output.
+# A page that redirects, or points with rel=canonical, to a page another URL
+# of the run already produced is logged as collapsed and left out.
+def process_urls(urls_tags, project, progress_bar=None, out=None, job=None, store=None):
+    client = project_client(project)
+    cache = project_cache(project)
+    pool = project_pool(project)
+    queued = time.perf_counter()
+    claims = AliasClaims()
+    politeness = project_politeness(project, len(urls_tags))
+
+    def convert(url, tags):
+        page = {}
+        markdown_text, log_entry = logged_html_to_markdown(url, tags, project, client, cache, pool, queued, politeness, page)
+        status = result_status(log_entry["status"])
+        owner = claims.claim(url, page.get("url")) if status == DONE else None
+        if owner is not None:
+            collapsed = collapse_entry(url, owner, "redirect or rel=canonical")
+            project.log.append(collapsed)
+            markdown_text, status = None, DUPLICATE
+        if store is not None:
+            store.record_result(project.id, url, status, markdown_text)
+            store.append_log(project.id, log_entry)
+            if owner is not None:
+                store.append_log(project.id, collapsed)
+        return markdown_text
+
+    def update_progress(idx, markdown_text, done, total):
+        if out is not None:
+            out.put(idx, markdown_text + "\n\n" if markdown_text is not None else "")
+        if progress_bar is not None:
+            progress_bar.progress(done / total)
+        if job is not None:
+            job.record(idx, markdown_text, done, total)
+
+    results = convert_urls(urls_tags, project, convert, update_progress, keep_results=out is None and store is None,
+                           cancel=job.cancel_event if job is not None else None, politeness=politeness)
+    if out is not None:
+        out.flush()
+        return out
+    if store is not None:
+        return None
+    return "".join(markdown_text + "\n\n" for markdown_text in results if markdown_text is not None)
+
+def near_duplicate_entry(url, original, dropped):
+    status = f"Near-duplicate of {original}" + (" (dropped)" if dropped else "")
+    return {"url": url, "time": time.time(), "status": status}
+
+# Yields (url, markdown) for every processed URL in the store, in input
+# order. With a deduper (boilerplate.ContentDeduper) the converted pages are
+# read twice and come back cleaned; dropped near-duplicates are left out and
+# on_duplicate(url, original) is called for every near-duplicate.
+def iter_output(store, project_id, deduper=None, on_duplicate=None):
+    if deduper is not None:
+        for url, status, markdown_text in store.iter_results(project_id):
+            if status == DONE:
+                deduper.observe(url, markdown_text)
+    for url, status, markdown_text in store.iter_results(project_id):
+        if markdown_text is None or status == PENDING:
+            continue
+        if deduper is not None and status == DONE:
+            markdown_text, original = deduper.clean(url, markdown_text)
+            if original is not None and on_duplicate is not None:
+                on_duplicate(url, original)
+            if markdown_text is None:
+                continue
+        yield url, markdown_text
+
+# Combined output of every processed URL in the store, in input order. Writes
+# to out (e.g. a MarkdownSpool) when given, otherwise returns a string.
+def assemble_output(store, project_id, out=None, deduper=None, on_duplicate=None):
+    pieces = []
+    write = out.write if out is not None else pieces.append
+    for url, markdown_text in iter_output(store, project_id, deduper, on_duplicate):
+        write(markdown_text + "\n\n")
+    return out if out is not None else "".join(pieces)
+
+# Yields the token-budgeted chunks of every page in the store, in input order
+def iter_chunks(store, project):
+    count = get_token_counter(project.token_counter)
+    for url, markdown_text in iter_output(store, project.id, project_deduper(project)):
+        yield from chunk_markdown(url, markdown_text, project.chunk_tokens, count)
+
+# Adds every processed URL in the store to archive (export.ArchiveWriter)
+def archive_stored(store, project_id, archive):
+    for url, status, markdown_text in store.iter_results(project_id):
+        if status != PENDING:
+            archive.add(url, status, markdown_text if status == DONE else None)
+    return archive
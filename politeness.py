@@ -0,0 +1,291 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from fetcher import host_of
+
+# Per-host politeness in front of the fetch path: token-bucket rate limits
+# (tightened by robots.txt crawl-delay), backoff with jitter that honours
+# Retry-After, a capped retry budget per run, and a robots.txt cache. The
+# dispatcher in fetch_concurrently asks try_acquire() before starting a URL,
+# so while one host waits the free workers go to other hosts. Only requests
+# that reach the network are paced: URLs the response cache can answer
+# start without a token.
+
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+DEFAULT_MAX_RETRIES = 3
+# Retries allowed per run on top of the first attempts, as a share of the URLs
+RETRY_BUDGET_RATIO = 0.2
+MIN_RETRY_BUDGET = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+MAX_RETRY_AFTER = 300.0
+ROBOTS_TTL = 3600.0
+ROBOTS_MAX_BYTES = 512 * 1024
+ROBOTS_AGENT = "streamlit-md"
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def ready_at(self, now):
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+
+# Process-wide, so every run and session shares one budget per host
+class HostScheduler:
+    def __init__(self):
+        self._buckets = {}
+        self._backoff_until = {}
+        self._crawl_delays = {}
+        self._lock = threading.Lock()
+
+    # One bucket per host and setting, so a run with a lower rate doesn't
+    # loosen or tighten another's; robots.txt crawl-delay applies to all
+    def _bucket(self, host, rate, burst, now):
+        key = (host, rate, burst)
+        delay = self._crawl_delays.get(host)
+        if delay and delay[1] <= now:
+            del self._crawl_delays[host]
+            delay = None
+        if delay:
+            rate, burst = min(rate, 1.0 / delay[0]), 1
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+        bucket.rate, bucket.burst = rate, burst
+        return bucket
+
+    def try_acquire(self, host, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        now = time.monotonic()
+        with self._lock:
+            if self._backoff_until.get(host, 0) > now:
+                return False
+            return self._bucket(host, rate, burst, now).try_take(now)
+
+    # Gives back a token that was taken for a request that never went out
+    def refund(self, host, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(host, rate, burst, now)
+            bucket._refill(now)
+            bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+
+    def ready_at(self, host, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        now = time.monotonic()
+        with self._lock:
+            return max(self._backoff_until.get(host, 0), self._bucket(host, rate, burst, now).ready_at(now))
+
+    def backoff(self, host, seconds):
+        with self._lock:
+            self._backoff_until[host] = max(self._backoff_until.get(host, 0), time.monotonic() + seconds)
+
+    # Kept for ttl seconds, like the robots.txt it came from; None drops it
+    def set_crawl_delay(self, host, seconds, ttl=ROBOTS_TTL):
+        with self._lock:
+            if seconds:
+                self._crawl_delays[host] = (seconds, time.monotonic() + ttl)
+            else:
+                self._crawl_delays.pop(host, None)
+
+
+# robots.txt per scheme://host, fetched once and kept for ttl seconds. A
+# missing or unreadable robots.txt allows everything.
+class RobotsCache:
+    def __init__(self, ttl=ROBOTS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def rules(self, client, url):
+        parts = urlsplit(url)
+        site = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            site_lock = self._locks.setdefault(site, threading.Lock())
+        # One fetch per site even when several workers ask at once
+        with site_lock:
+            entry = self._entries.get(site)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            parser = RobotFileParser()
+            try:
+                response = client.get(site + "/robots.txt", max_bytes=ROBOTS_MAX_BYTES)
+                if response.ok:
+                    parser.parse(response.text.splitlines())
+                else:
+                    parser = None
+            except requests.RequestException:
+                parser = None
+            self._entries[site] = (parser, time.monotonic() + self.ttl)
+            return parser
+
+    # The rules for url if they are cached, without fetching them; False when
+    # they aren't
+    def cached_rules(self, url):
+        parts = urlsplit(url)
+        entry = self._entries.get(f"{parts.scheme}://{parts.netloc}")
+        if entry is None or entry[1] <= time.monotonic():
+            return False
+        return entry[0]
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Full jitter: a random delay up to the exponential cap, unless the server said
+def retry_delay(attempt, response=None):
+    retry_after = retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, MAX_RETRY_AFTER)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class RetryBudget:
+    def __init__(self, retries):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_scheduler = HostScheduler()
+_robots = RobotsCache()
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def get_robots_cache():
+    return _robots
+
+
+# Politeness settings for one run. Pass it to fetch_concurrently as the
+# scheduler and to fetch_body, which checks robots.txt and retries through it.
+class Politeness:
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 respect_robots=True, total_urls=0, scheduler=None, robots=None, cache=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.respect_robots = respect_robots
+        self.budget = RetryBudget(max(MIN_RETRY_BUDGET, int(total_urls * RETRY_BUDGET_RATIO)))
+        self.scheduler = scheduler or get_scheduler()
+        self.robots = robots or get_robots_cache()
+        self.cache = cache
+        # URLs started with a token their request hasn't used yet
+        self._paced = set()
+        self._lock = threading.Lock()
+
+    # URLs the cache can answer, and URLs the cached robots.txt already
+    # disallows, start without a token
+    def try_acquire(self, host, url=None):
+        if url is not None and self.cache is not None and self.cache.can_serve(url):
+            return True
+        if url is not None and self.respect_robots:
+            rules = self.robots.cached_rules(url)
+            if rules and not rules.can_fetch(ROBOTS_AGENT, url):
+                return True
+        if not self.scheduler.try_acquire(host, self.rate, self.burst):
+            return False
+        if url is not None:
+            with self._lock:
+                self._paced.add(url)
+        return True
+
+    # Called right before a request for url goes out: uses the token the URL
+    # was started with, or waits for one (retries, and cache answers that
+    # turned into a request after all)
+    def pace(self, url):
+        with self._lock:
+            if url in self._paced:
+                self._paced.discard(url)
+                return
+        host = host_of(url)
+        while not self.scheduler.try_acquire(host, self.rate, self.burst):
+            time.sleep(max(0.01, self.ready_at(host) - time.monotonic()))
+
+    def ready_at(self, host):
+        return self.scheduler.ready_at(host, self.rate, self.burst)
+
+    # Returns the reason when robots.txt disallows the URL, else None. A
+    # token the URL was started with goes back to its host.
+    def robots_block(self, client, url):
+        if not self.respect_robots:
+            return None
+        rules = self.robots.rules(client, url)
+        if rules is None:
+            return None
+        delay = rules.crawl_delay(ROBOTS_AGENT)
+        self.scheduler.set_crawl_delay(host_of(url), float(delay) if delay else None, self.robots.ttl)
+        if not rules.can_fetch(ROBOTS_AGENT, url):
+            with self._lock:
+                paced = url in self._paced
+                self._paced.discard(url)
+            if paced:
+                self.scheduler.refund(host_of(url), self.rate, self.burst)
+            return "disallowed by robots.txt"
+        return None
+
+    # Calls get() until it returns a response that isn't a retryable status
+    # or raises something other than a connection error or timeout. While it
+    # waits the host is marked as backing off. get() calls pace() before its
+    # request, so retries wait for the host's bucket. Returns (response, retries).
+    def fetch(self, url, get):
+        host = host_of(url)
+        attempt = 0
+        while True:
+            try:
+                response = get()
+                if response.status_code not in RETRY_STATUSES:
+                    return response, attempt
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            if attempt >= self.max_retries or not self.budget.take():
+                if error is not None:
+                    raise error
+                return response, attempt
+            delay = retry_delay(attempt, response)
+            self.scheduler.backoff(host, delay)
+            time.sleep(delay)
+            attempt += 1
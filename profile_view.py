@@ -0,0 +1,29 @@
+import streamlit as st
+
+from profiles import profiles_from_json, profiles_to_json, merge_profiles
+
+
+# Editor for a project's extraction profiles: edit the JSON in place, import
+# a shared file (merged by name) or export the current set. A fragment, so
+# editing doesn't rerun the app.
+@st.fragment
+def show_profiles(project):
+    st.caption('A profile is {"name", "hosts": ["docs.example.com", "*.example.org"], "include": [CSS selectors], '
+               '"exclude": [CSS selectors]}. The first profile whose host pattern matches a URL is used; '
+               'with an empty include the selected tags are kept.')
+    text = st.text_area("Profiles (JSON)", profiles_to_json(project.profiles), height=200)
+    if st.button("Save Profiles"):
+        try:
+            project.profiles = profiles_from_json(text)
+            st.success(f"Saved {len(project.profiles)} profiles.")
+        except ValueError as e:
+            st.error(str(e))
+    uploaded = st.file_uploader("Import profiles", type=["json"])
+    if uploaded is not None and st.button("Import Profiles"):
+        try:
+            project.profiles = merge_profiles(project.profiles, profiles_from_json(uploaded.getvalue().decode("utf-8")))
+            st.success(f"Imported; {len(project.profiles)} profiles now.")
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(str(e))
+    st.download_button("Export Profiles", data=lambda: profiles_to_json(project.profiles), file_name=f"{project.name}-profiles.json",
+                       mime="application/json", on_click="ignore")
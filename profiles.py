@@ -0,0 +1,89 @@
+import json
+from fnmatch import fnmatchcase
+from functools import lru_cache
+
+import soupsieve
+
+from fetcher import host_of
+
+# Per-domain extraction profiles: CSS selectors for the content to keep
+# (include) and for what to cut out of the page (exclude), applied to every
+# URL whose host matches one of the profile's patterns, e.g.
+# "docs.example.com" or "*.example.org". The first matching profile wins and
+# an empty include keeps the URL's tags. Profiles are plain dicts so they can
+# be shared as JSON.
+
+PROFILE_FIELDS = ['name', 'hosts', 'include', 'exclude']
+
+
+def new_profile(name, hosts=(), include=(), exclude=()):
+    return {"name": name, "hosts": list(hosts), "include": list(include), "exclude": list(exclude)}
+
+
+# Compiled once per selector list and process (worker processes get their own)
+@lru_cache(maxsize=256)
+def compile_selectors(selectors):
+    return soupsieve.compile(", ".join(selectors)) if selectors else None
+
+
+# Returns the profile with its fields checked and its selectors compiled;
+# raises ValueError with the reason otherwise
+def validate_profile(profile):
+    if not isinstance(profile, dict) or not profile.get("name"):
+        raise ValueError(f"Profile without a name: {profile!r}")
+    checked = new_profile(str(profile["name"]))
+    for field in PROFILE_FIELDS[1:]:
+        values = profile.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        if not all(isinstance(value, str) and value.strip() for value in values):
+            raise ValueError(f"Profile {checked['name']}: {field} must be a list of strings")
+        checked[field] = [value.strip() for value in values]
+    if not checked["hosts"]:
+        raise ValueError(f"Profile {checked['name']}: no host patterns")
+    for field in ("include", "exclude"):
+        try:
+            compile_selectors(tuple(checked[field]))
+        except soupsieve.SelectorSyntaxError as e:
+            raise ValueError(f"Profile {checked['name']}: bad {field} selector: {e}") from None
+    return checked
+
+
+# Accepts a list of profiles or {"profiles": [...]}
+def profiles_from_json(text):
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Not valid JSON: {e}") from None
+    if isinstance(data, dict):
+        data = data.get("profiles", [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of profiles")
+    return [validate_profile(profile) for profile in data]
+
+
+# Imported profiles replace the ones with the same name; new ones go last
+def merge_profiles(profiles, imported):
+    by_name = {profile["name"]: profile for profile in imported}
+    merged = [by_name.pop(profile["name"], profile) for profile in profiles]
+    return merged + list(by_name.values())
+
+
+def profiles_to_json(profiles):
+    return json.dumps({"profiles": profiles}, indent=2, ensure_ascii=False)
+
+
+def match_profile(url, profiles):
+    host = host_of(url)
+    hostname = host.split(":")[0]
+    for profile in profiles or ():
+        if any(fnmatchcase(host, pattern.lower()) or fnmatchcase(hostname, pattern.lower()) for pattern in profile["hosts"]):
+            return profile
+    return None
+
+
+# (include, exclude) as tuples, the form extraction takes, or None
+def profile_selectors(profile):
+    if profile is None:
+        return None
+    return tuple(profile["include"]), tuple(profile["exclude"])
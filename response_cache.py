@@ -0,0 +1,358 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+from requests.structures import CaseInsensitiveDict
+
+from lru import LRUCache
+
+DEFAULT_CACHE_DIR = os.environ.get("STREAMLIT_MD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "streamlit-md", "http"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Response headers kept next to the body; the body is stored already decoded
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Expires")
+# In-memory tier shared by every session of the process: responses seen in
+# the last MEMORY_TTL seconds are served without touching disk or network
+MEMORY_TTL = 300
+MEMORY_MAX_BYTES = 128 * 1024 * 1024
+
+
+def normalize_cache_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def parse_cache_control(value):
+    directives = {}
+    for item in (value or "").split(","):
+        name, _, arg = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"')
+    return directives
+
+
+def freshness_deadline(headers, now):
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives:
+        return 0
+    if "max-age" in directives:
+        try:
+            return now + int(directives["max-age"])
+        except ValueError:
+            return 0
+    if headers.get("Expires"):
+        try:
+            return parsedate_to_datetime(headers["Expires"]).timestamp()
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+# Seconds a response may be served from the memory tier: no longer than its
+# declared freshness (none for no-store, no-cache or max-age=0), and ttl for
+# responses that declare nothing
+def memory_lifetime(headers, ttl, now):
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives:
+        return 0
+    if "no-cache" in directives or "max-age" in directives or headers.get("Expires"):
+        return min(ttl, freshness_deadline(headers, now) - now)
+    return ttl
+
+
+# Looks like the parts of requests.Response used by fetch_body.
+# cache_status is "hit" (served from disk without a request), "revalidated"
+# (304), "shared" (from the in-memory tier) or "coalesced" (waited for the
+# same URL being fetched for another session).
+class CachedResponse:
+    def __init__(self, url, headers, content, cache_status="hit", network_response=None):
+        self.url = url
+        self.status_code = 200
+        self.ok = True
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = True
+        self.cache_status = cache_status
+        self.history = [network_response] if network_response is not None else []
+        self.elapsed = timedelta(0)
+        self.connect_time = getattr(network_response, "connect_time", 0.0)
+
+    def raise_for_status(self):
+        pass
+
+
+# Disk-backed HTTP cache keyed on the normalized URL. Bodies are stored
+# zlib-compressed; freshness follows Cache-Control/Expires, and stale entries
+# are revalidated with If-None-Match/If-Modified-Since so a 304 skips the body.
+# The total size is bounded and the least recently used entries go first.
+# In front of it sits a memory tier with a TTL and a size cap, and fetches
+# are single-flight: a URL requested while another session is fetching it
+# waits for that result. stats counts fetches by cache_status.
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, memory_ttl=MEMORY_TTL, memory_max_bytes=MEMORY_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_ttl = memory_ttl
+        self._lock = threading.Lock()
+        self._index = None
+        self._total = 0
+        # key -> (url, headers, content, expires on the monotonic clock)
+        self._recent = LRUCache(memory_max_bytes, sizeof=lambda entry: len(entry[2]))
+        self._in_flight = {}
+        self.stats = Counter()
+
+    def _paths(self, url):
+        key = hashlib.sha256(normalize_cache_url(url).encode()).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return key, base + ".json", base + ".body"
+
+    def _load_index(self):
+        # key -> [size, last access]; the meta file's mtime is the access time
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total = 0
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for item in os.scandir(bucket.path):
+                if not item.name.endswith(".json"):
+                    continue
+                key = item.name[:-5]
+                body_path = os.path.join(bucket.path, key + ".body")
+                try:
+                    size = os.path.getsize(body_path) + item.stat().st_size
+                except OSError:
+                    continue
+                self._index[key] = [size, item.stat().st_mtime]
+                self._total += size
+
+    def lookup(self, url):
+        key, meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or not {"url", "headers", "expires"} <= meta.keys():
+            return None
+        return meta
+
+    def read_body(self, url):
+        key, meta_path, body_path = self._paths(url)
+        try:
+            with open(body_path, "rb") as f:
+                content = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+        now = time.time()
+        with self._lock:
+            self._load_index()
+            if key in self._index:
+                self._index[key][1] = now
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+        return content
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def store(self, url, response):
+        if "no-store" in parse_cache_control(response.headers.get("Cache-Control")):
+            return
+        now = time.time()
+        meta = {
+            "url": response.url or url,
+            "headers": {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+            "stored": now,
+            "expires": freshness_deadline(response.headers, now),
+        }
+        if not (meta["expires"] > now or "ETag" in meta["headers"] or "Last-Modified" in meta["headers"]):
+            # Nothing to revalidate with and not fresh: the entry would never be used
+            return
+        key, meta_path, body_path = self._paths(url)
+        body = zlib.compress(response.content)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, body_path)
+        self._write_meta(meta_path, meta)
+        size = len(body) + os.path.getsize(meta_path)
+        with self._lock:
+            self._load_index()
+            previous = self._index.get(key)
+            if previous:
+                self._total -= previous[0]
+            self._index[key] = [size, now]
+            self._total += size
+            self._evict()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            base = os.path.join(self.directory, key[:2], key)
+            for path in (base + ".json", base + ".body"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            del self._index[key]
+            self._total -= size
+            if self._total <= self.max_bytes:
+                break
+
+    def refresh(self, url, meta, headers):
+        now = time.time()
+        for name in STORED_HEADERS:
+            if name in headers:
+                meta["headers"][name] = headers[name]
+        meta["expires"] = freshness_deadline(CaseInsensitiveDict(meta["headers"]), now)
+        key, meta_path, body_path = self._paths(url)
+        self._write_meta(meta_path, meta)
+
+    def _recent_response(self, key, cache_status):
+        entry = self._recent.get(key)
+        if entry is None or entry[3] <= time.monotonic():
+            return None
+        return CachedResponse(entry[0], entry[1], entry[2], cache_status)
+
+    def _count(self, response):
+        with self._lock:
+            self.stats[response.cache_status] += 1
+        return response
+
+    # True when fetch() should answer without a request: the page is fresh in
+    # memory or on disk, or another fetch of it is under way
+    def can_serve(self, url):
+        key = normalize_cache_url(url)
+        entry = self._recent.get(key)
+        if entry is not None and entry[3] > time.monotonic():
+            return True
+        with self._lock:
+            if key in self._in_flight:
+                return True
+        meta = self.lookup(url)
+        return meta is not None and meta["expires"] > time.time()
+
+    # kwargs (e.g. max_bytes, html_only) are passed on to client.get, and
+    # before_request() is called right before a request goes out. Waiters
+    # only share a successful response; if the first fetch fails or is
+    # skipped they fetch for themselves, since their limits may differ.
+    def fetch(self, client, url, before_request=None, **kwargs):
+        key = normalize_cache_url(url)
+        while True:
+            response = self._recent_response(key, "shared")
+            if response is not None:
+                return self._count(response)
+            with self._lock:
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    in_flight = self._in_flight[key] = threading.Event()
+                    break
+            in_flight.wait()
+            response = self._recent_response(key, "coalesced")
+            if response is not None:
+                return self._count(response)
+        try:
+            response = self._fetch(client, url, before_request, **kwargs)
+            if response.status_code == 200:
+                self._remember(key, url, response)
+            return self._count(response)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.set()
+
+    def _remember(self, key, url, response):
+        now = time.time()
+        lifetime = memory_lifetime(response.headers, self.memory_ttl, now)
+        if response.cache_status == "hit":
+            # Freshness counts from when the page was stored, not from now
+            meta = self.lookup(url)
+            if meta is not None and meta["expires"]:
+                lifetime = min(lifetime, meta["expires"] - now)
+        if lifetime > 0:
+            headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+            self._recent.put(key, (response.url or url, headers, response.content, time.monotonic() + lifetime))
+
+    def _fetch(self, client, url, before_request=None, **kwargs):
+        meta = self.lookup(url)
+        if meta is not None:
+            if meta["expires"] > time.time():
+                content = self.read_body(url)
+                if content is not None:
+                    return CachedResponse(meta["url"], meta["headers"], content)
+            else:
+                conditional = {}
+                if "ETag" in meta["headers"]:
+                    conditional["If-None-Match"] = meta["headers"]["ETag"]
+                if "Last-Modified" in meta["headers"]:
+                    conditional["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+                if before_request:
+                    before_request()
+                response = client.get(url, headers=conditional, **kwargs)
+                if response.status_code == 304:
+                    content = self.read_body(url)
+                    if content is not None:
+                        self.refresh(url, meta, response.headers)
+                        return CachedResponse(meta["url"], meta["headers"], content, "revalidated", response)
+                else:
+                    if response.status_code == 200:
+                        self.store(url, response)
+                    response.cache_status = "miss"
+                    return response
+        if before_request:
+            before_request()
+        response = client.get(url, **kwargs)
+        if response.status_code == 200:
+            self.store(url, response)
+        response.cache_status = "miss"
+        return response
+
+    def size(self):
+        with self._lock:
+            self._load_index()
+            return len(self._index), self._total
+
+    def memory_size(self):
+        return len(self._recent), self._recent.total
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._index = {}
+            self._total = 0
+            self.stats.clear()
+        self._recent.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from compact import RunLog
+
+DEFAULT_DB_PATH = os.environ.get("STREAMLIT_MD_DB", os.path.join(os.path.expanduser("~"), ".local", "share", "streamlit-md", "projects.db"))
+
+# Project attributes persisted as JSON; each app only restores the ones its
+# Project class has.
+CONFIG_FIELDS = ['name', 'urls', 'selected_tags', 'file_name', 'ignore_links', 'ignore_images',
+                 'max_workers', 'max_per_host', 'connect_timeout', 'read_timeout', 'use_cache',
+                 'extraction_mode', 'parser', 'use_strainer', 'stream_export', 'cpu_workers',
+                 'max_download_bytes', 'html_only', 'strip_boilerplate', 'near_duplicates',
+                 'chunk_tokens', 'token_counter', 'archive_format', 'host_rate', 'host_burst', 'max_retries',
+                 'respect_robots', 'profiles']
+
+# Query parameter holding a browser session's owner key
+OWNER_PARAM = 'owner'
+# Owner key that takes over the projects saved before owners were tracked;
+# until it is set they stay unowned and no session sees them
+LEGACY_OWNER = os.environ.get("STREAMLIT_MD_LEGACY_OWNER", "")
+
+# Per-URL status: pending until processed, then done, failed, skipped (not
+# HTML or too large) or duplicate (same page as another URL); only failed
+# URLs are retried on resume
+PENDING, DONE, FAILED, SKIPPED, DUPLICATE = 'pending', 'done', 'failed', 'skipped', 'duplicate'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS urls (
+    project_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tags TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    markdown BLOB,
+    updated REAL NOT NULL,
+    options TEXT,
+    PRIMARY KEY (project_id, url)
+);
+CREATE TABLE IF NOT EXISTS log (
+    project_id TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_project ON log (project_id);
+"""
+
+
+# SQLite-backed store for projects, their URLs and per-URL results. Results
+# are written as each URL finishes and read back lazily, so a refresh, restart
+# or session timeout loses nothing and an interrupted run can resume with the
+# URLs that are still pending or failed. Markdown is stored zlib-compressed.
+# Projects belong to an owner key (see owner_key), so every user of a shared
+# server only loads, saves and deletes their own.
+class ProjectStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            # Databases from before options were tracked
+            if "options" not in {row[1] for row in conn.execute("PRAGMA table_info(urls)")}:
+                conn.execute("ALTER TABLE urls ADD COLUMN options TEXT")
+            # And before projects had owners
+            if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(projects)")}:
+                conn.execute("ALTER TABLE projects ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS projects_owner ON projects (owner)")
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # A project of another owner is left as it is
+    def save_project(self, project, position=0, owner=''):
+        config = {field: getattr(project, field) for field in CONFIG_FIELDS if hasattr(project, field)}
+        with self._connection() as conn:
+            conn.execute("INSERT INTO projects (id, position, config, updated, owner) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT(id) DO UPDATE SET position = excluded.position, config = excluded.config, updated = excluded.updated "
+                         "WHERE projects.owner = excluded.owner",
+                         (project.id, position, json.dumps(config), time.time(), owner))
+
+    # Projects saved before owners were tracked go to legacy_owner when it loads
+    def load_projects(self, factory, owner='', log_limit=1000, legacy_owner=LEGACY_OWNER):
+        projects = []
+        if owner and owner == legacy_owner:
+            with self._connection() as conn:
+                conn.execute("UPDATE projects SET owner = ? WHERE owner = ''", (owner,))
+        rows = self._connection().execute("SELECT id, config FROM projects WHERE owner = ? ORDER BY position, updated", (owner,)).fetchall()
+        for project_id, config in rows:
+            config = json.loads(config)
+            project = factory(config.get('name', 'Project'))
+            project.id = project_id
+            for field, value in config.items():
+                if hasattr(project, field):
+                    setattr(project, field, value)
+            if hasattr(project, 'urls_tags'):
+                project.urls_tags = self.urls_tags(project_id)
+            project.log = RunLog(self.load_log(project_id, log_limit), log_limit)
+            projects.append(project)
+        return projects
+
+    def delete_project(self, project_id, owner=''):
+        with self._connection() as conn:
+            if not conn.execute("DELETE FROM projects WHERE id = ? AND owner = ?", (project_id, owner)).rowcount:
+                return
+            conn.execute("DELETE FROM urls WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM log WHERE project_id = ?", (project_id,))
+
+    # Replaces the project's URL list and returns how it changed, as counts of
+    # added, changed, removed and unchanged URLs. URLs whose tags and options
+    # (options maps each URL to a string describing its conversion settings;
+    # None doesn't compare them) did not change keep their status and result; the others become pending
+    # and removed URLs are deleted with their results. When anything changed,
+    # duplicates become pending too: the URL whose page they shared may be gone.
+    def set_urls(self, project_id, urls_tags, options=None):
+        now = time.time()
+        changes = dict.fromkeys(('added', 'changed', 'removed', 'unchanged'), 0)
+        with self._connection() as conn:
+            existing = {url: (tags, stored) for url, tags, stored in
+                        conn.execute("SELECT url, tags, options FROM urls WHERE project_id = ?", (project_id,))}
+            for position, (url, tags) in enumerate(urls_tags.items()):
+                tags_json = json.dumps(list(tags))
+                url_options = options.get(url) if options is not None else None
+                previous = existing.pop(url, None)
+                # Results stored before options were tracked are kept
+                if previous is not None and previous[0] == tags_json and (url_options is None or previous[1] in (None, url_options)):
+                    changes['unchanged'] += 1
+                    conn.execute("UPDATE urls SET position = ?, options = COALESCE(?, options) WHERE project_id = ? AND url = ?",
+                                 (position, url_options, project_id, url))
+                else:
+                    changes['added' if previous is None else 'changed'] += 1
+                    conn.execute("INSERT OR REPLACE INTO urls (project_id, url, position, tags, status, markdown, updated, options) "
+                                 "VALUES (?, ?, ?, ?, ?, NULL, ?, ?)", (project_id, url, position, tags_json, PENDING, now, url_options))
+            conn.executemany("DELETE FROM urls WHERE project_id = ? AND url = ?", [(project_id, url) for url in existing])
+            changes['removed'] = len(existing)
+            if changes['added'] or changes['changed'] or changes['removed']:
+                conn.execute("UPDATE urls SET status = ? WHERE project_id = ? AND status = ?", (PENDING, project_id, DUPLICATE))
+        return changes
+
+    def urls_tags(self, project_id):
+        rows = self._connection().execute("SELECT url, tags FROM urls WHERE project_id = ? ORDER BY position", (project_id,))
+        return {url: json.loads(tags) for url, tags in rows}
+
+    def pending_urls(self, project_id):
+        rows = self._connection().execute("SELECT url, tags FROM urls WHERE project_id = ? AND status IN (?, ?) ORDER BY position",
+                                          (project_id, PENDING, FAILED))
+        return {url: json.loads(tags) for url, tags in rows}
+
+    def reset(self, project_id):
+        with self._connection() as conn:
+            conn.execute("UPDATE urls SET status = ? WHERE project_id = ?", (PENDING, project_id))
+
+    def record_result(self, project_id, url, status, markdown_text):
+        with self._connection() as conn:
+            conn.execute("UPDATE urls SET status = ?, markdown = ?, updated = ? WHERE project_id = ? AND url = ?",
+                         (status, zlib.compress(markdown_text.encode()) if markdown_text is not None else None, time.time(), project_id, url))
+
+    def status_counts(self, project_id):
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM urls WHERE project_id = ? GROUP BY status", (project_id,))
+        return dict(rows.fetchall())
+
+    def result(self, project_id, url):
+        row = self._connection().execute("SELECT markdown FROM urls WHERE project_id = ? AND url = ?", (project_id, url)).fetchone()
+        return zlib.decompress(row[0]).decode() if row and row[0] is not None else None
+
+    # Yields (url, status, markdown) in input order, one row at a time
+    def iter_results(self, project_id):
+        cursor = self._connection().execute("SELECT url, status, markdown FROM urls WHERE project_id = ? ORDER BY position", (project_id,))
+        for url, status, markdown in cursor:
+            yield url, status, zlib.decompress(markdown).decode() if markdown is not None else None
+
+    def append_log(self, project_id, entry):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO log (project_id, entry) VALUES (?, ?)", (project_id, json.dumps(entry)))
+
+    def load_log(self, project_id, limit=1000):
+        rows = self._connection().execute("SELECT entry FROM (SELECT rowid, entry FROM log WHERE project_id = ? ORDER BY rowid DESC LIMIT ?) ORDER BY rowid",
+                                          (project_id, limit))
+        return [json.loads(entry) for entry, in rows]
+
+    def clear_log(self, project_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM log WHERE project_id = ?", (project_id,))
+
+
+# The owner key of a browser session, kept in the page URL (?owner=...) so a
+# refresh or a bookmark finds the same projects; a new key otherwise.
+# query_params is st.query_params.
+def owner_key(query_params):
+    owner = query_params.get(OWNER_PARAM)
+    if not owner:
+        owner = query_params[OWNER_PARAM] = uuid.uuid4().hex
+    return owner
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProjectStore()
+        return _store
@@ -0,0 +1,25 @@
+import re
+
+URL_PATTERN = re.compile(r'https?://[^\s)\]]+')
+
+
+def url_spans(text):
+    return [(match.start(), match.end(), match.group()) for match in URL_PATTERN.finditer(text)]
+
+# Rebuilds text in one pass, replacing every recorded URL span with the
+# fetched result for that URL. Each occurrence is replaced exactly once, so a
+# URL that is a prefix of another, or a URL that shows up inside fetched
+# Markdown, is never rewritten a second time. When out is given the pieces are
+# written to it (anything with a write method) instead of joined in memory.
+def substitute_urls(text, spans, replacements, out=None):
+    pieces = []
+    write = out.write if out is not None else pieces.append
+    last = 0
+    for start, end, url in spans:
+        if url not in replacements:
+            continue
+        write(text[last:start])
+        write(replacements[url])
+        last = end
+    write(text[last:])
+    return out if out is not None else "".join(pieces)
@@ -0,0 +1,116 @@
+import pytest
+import requests
+
+import canonical
+from canonical import AliasClaims, dedupe_urls, forget_alias, remember_alias, resolve_key, url_key
+from pipeline import fetch_body
+
+
+@pytest.fixture(autouse=True)
+def clear_aliases():
+    canonical._aliases.clear()
+    yield
+    canonical._aliases.clear()
+
+
+def response(url, body, status=200, history=()):
+    r = requests.Response()
+    r.status_code = status
+    r.url = url
+    r._content = body.encode()
+    r.headers["Content-Type"] = "text/html; charset=utf-8"
+    r.history = list(history)
+    return r
+
+
+def redirect(url, status):
+    r = response(url, "", status)
+    r.headers["Location"] = "/"
+    return r
+
+
+class StubClient:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def get(self, url, **kwargs):
+        return self.responses[url]
+
+
+def page(title, canonical_url=None):
+    link = f'<link rel="canonical" href="{canonical_url}">' if canonical_url else ""
+    return f"<html><head>{link}</head><body><article>{title}</article></body></html>"
+
+
+def test_url_key_ignores_scheme_fragment_tracking_and_trailing_slash():
+    assert url_key("https://Example.com/a/?utm_source=x#top") == url_key("http://example.com/a")
+    assert url_key("https://example.com/a?b=1") != url_key("https://example.com/a?b=2")
+
+
+def test_dedupe_collapses_known_aliases():
+    remember_alias("https://example.com/old", "https://example.com/new")
+    collapsed = []
+    unique, aliases = dedupe_urls(["https://example.com/new", "https://example.com/old", "https://example.com/new#x"],
+                                  lambda url, kept, reason: collapsed.append((url, reason)))
+    assert unique == ["https://example.com/new"]
+    assert aliases["https://example.com/old"] == "https://example.com/new"
+    assert [reason for _, reason in collapsed] == ["known redirect or rel=canonical", "same page after normalization"]
+
+
+def test_alias_to_itself_is_forgotten():
+    remember_alias("https://example.com/a", "https://example.com/b")
+    remember_alias("https://example.com/a", "https://example.com/a/")
+    assert resolve_key("https://example.com/a") == url_key("https://example.com/a")
+
+
+def test_claims_go_by_where_the_fetch_landed():
+    claims = AliasClaims()
+    assert claims.claim("https://example.com/a", "https://example.com/page") is None
+    assert claims.claim("https://example.com/b", "https://example.com/page") == "https://example.com/a"
+    assert claims.claim("https://example.com/c", "https://example.com/other") is None
+
+
+def test_stale_alias_does_not_collapse_a_page_that_serves_itself():
+    # An earlier run saw /home redirect permanently to /p
+    remember_alias("https://example.com/home", "https://example.com/p")
+    client = StubClient({
+        "https://example.com/home": response("https://example.com/home", page("home")),
+        "https://example.com/p": response("https://example.com/p", page("p")),
+    })
+    claims = AliasClaims()
+    for url in ["https://example.com/home", "https://example.com/p"]:
+        found = {}
+        fetch_body(url, client, page=found)
+        assert found["url"] == url
+        assert claims.claim(url, found["url"]) is None
+    assert resolve_key("https://example.com/home") == url_key("https://example.com/home")
+
+
+def test_permanent_redirect_collapses_and_temporary_does_not():
+    client = StubClient({
+        "https://example.com/moved": response("https://example.com/p", page("p"), history=[redirect("https://example.com/moved", 301)]),
+        "https://example.com/elsewhere": response("https://example.com/p", page("p"), history=[redirect("https://example.com/elsewhere", 302)]),
+    })
+    found = {}
+    fetch_body("https://example.com/moved", client, page=found)
+    assert found["url"] == "https://example.com/p"
+    assert resolve_key("https://example.com/moved") == url_key("https://example.com/p")
+    fetch_body("https://example.com/elsewhere", client)
+    assert resolve_key("https://example.com/elsewhere") == url_key("https://example.com/elsewhere")
+
+
+def test_canonical_link_is_remembered_until_the_page_drops_it():
+    client = StubClient({"https://example.com/a?ref=1": response("https://example.com/a?ref=1", page("a", "/a"))})
+    found = {}
+    fetch_body("https://example.com/a?ref=1", client, page=found)
+    assert found["url"] == "https://example.com/a"
+    assert resolve_key("https://example.com/a?ref=1") == url_key("https://example.com/a")
+    client.responses["https://example.com/a?ref=1"] = response("https://example.com/a?ref=1", page("a"))
+    fetch_body("https://example.com/a?ref=1", client)
+    assert resolve_key("https://example.com/a?ref=1") == url_key("https://example.com/a?ref=1")
+
+
+def test_forget_alias():
+    remember_alias("https://example.com/a", "https://example.com/b")
+    forget_alias("https://example.com/a/")
+    assert resolve_key("https://example.com/a") == url_key("https://example.com/a")
@@ -0,0 +1,48 @@
+from chunking import chunk_markdown, estimate_tokens, markdown_blocks
+
+
+def counting(calls):
+    def count(text):
+        calls.append(text)
+        return estimate_tokens(text)
+    return count
+
+
+def test_small_page_is_one_chunk():
+    chunks = chunk_markdown("https://example.com/", "# Title\n\nSome text.\n\nMore text.", 100)
+    assert len(chunks) == 1
+    assert chunks[0]["headings"] == ["Title"]
+    assert chunks[0]["text"] == "# Title\n\nSome text.\n\nMore text."
+    assert chunks[0]["chunks"] == 1
+
+
+def test_chunks_stay_under_budget():
+    text = "\n\n".join(f"## Section {i}\n\n" + "word " * 150 for i in range(10))
+    chunks = chunk_markdown("https://example.com/", text, 64)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["tokens"] <= 64
+        assert estimate_tokens(chunk["text"]) <= chunk["tokens"]
+
+
+def test_heading_starts_chunk_with_its_content():
+    text = "# A\n\n" + "x" * 200 + "\n\n# B\n\n" + "y" * 200
+    chunks = chunk_markdown("https://example.com/", text, 60)
+    assert [chunk["text"].split("\n")[0] for chunk in chunks] == ["# A", "# B"]
+    assert chunks[1]["headings"] == ["B"]
+
+
+def test_oversized_block_counts_each_part_once():
+    words = [f"word{i}" for i in range(1000)]
+    calls = []
+    blocks = list(markdown_blocks(" ".join(words), 50, counting(calls)))
+    assert " ".join(text for text, _, _ in blocks) == " ".join(words)
+    assert all(tokens <= 50 for _, tokens, _ in blocks)
+    # The block, the separator and each word
+    assert len(calls) == len(words) + 2
+
+
+def test_single_word_over_budget_is_kept_whole():
+    word = "x" * 400
+    blocks = list(markdown_blocks(word, 10, estimate_tokens))
+    assert blocks == [(word, estimate_tokens(word), 0)]
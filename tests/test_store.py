@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from pipeline import Project
+from store import ProjectStore, DONE, DUPLICATE, FAILED, PENDING
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProjectStore(str(tmp_path / "projects.db"))
+
+
+def test_set_urls_counts_changes(store):
+    changes = store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]})
+    assert changes == {"added": 2, "changed": 0, "removed": 0, "unchanged": 0}
+    store.record_result("p", "https://a/", DONE, "# A")
+    changes = store.set_urls("p", {"https://a/": ["article"], "https://b/": ["main"], "https://c/": ["article"]})
+    assert changes == {"added": 1, "changed": 1, "removed": 0, "unchanged": 1}
+    assert store.result("p", "https://a/") == "# A"
+    changes = store.set_urls("p", {"https://a/": ["article"]})
+    assert changes == {"added": 0, "changed": 0, "removed": 2, "unchanged": 1}
+    assert store.urls_tags("p") == {"https://a/": ["article"]}
+
+
+def test_changed_options_make_url_pending(store):
+    store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]}, {"https://a/": "x", "https://b/": "x"})
+    store.record_result("p", "https://a/", DONE, "# A")
+    store.record_result("p", "https://b/", DONE, "# B")
+    changes = store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]}, {"https://a/": "x", "https://b/": "y"})
+    assert changes["changed"] == 1 and changes["unchanged"] == 1
+    assert store.pending_urls("p") == {"https://b/": ["article"]}
+    # Without options nothing is compared
+    assert store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]})["unchanged"] == 2
+
+
+def test_duplicates_become_pending_when_urls_change(store):
+    store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]})
+    store.record_result("p", "https://a/", DONE, "# A")
+    store.record_result("p", "https://b/", DUPLICATE, None)
+    store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"]})
+    assert store.status_counts("p") == {DONE: 1, DUPLICATE: 1}
+    store.set_urls("p", {"https://b/": ["article"]})
+    assert store.status_counts("p") == {PENDING: 1}
+
+
+def test_pending_urls_include_failed(store):
+    store.set_urls("p", {"https://a/": ["article"], "https://b/": ["article"], "https://c/": ["article"]})
+    store.record_result("p", "https://a/", DONE, "# A")
+    store.record_result("p", "https://b/", FAILED, None)
+    assert list(store.pending_urls("p")) == ["https://b/", "https://c/"]
+
+
+def test_projects_are_scoped_to_their_owner(store):
+    mine, theirs = Project("Mine"), Project("Theirs")
+    store.save_project(mine, 0, "alice")
+    store.save_project(theirs, 0, "bob")
+    assert [project.name for project in store.load_projects(Project, "alice")] == ["Mine"]
+    # Saving or deleting another owner's project does nothing
+    mine.name = "Taken"
+    store.save_project(mine, 0, "bob")
+    store.delete_project(mine.id, "bob")
+    assert [project.name for project in store.load_projects(Project, "alice")] == ["Mine"]
+    assert [project.name for project in store.load_projects(Project, "bob")] == ["Theirs"]
+
+
+def test_projects_saved_before_owners_stay_unowned(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE projects (id TEXT PRIMARY KEY, position INTEGER NOT NULL, config TEXT NOT NULL, updated REAL NOT NULL)")
+    conn.execute("""INSERT INTO projects VALUES ('old', 0, '{"name": "Old"}', 0)""")
+    conn.commit()
+    conn.close()
+    store = ProjectStore(path)
+    assert store.load_projects(Project, "random", legacy_owner="") == []
+    assert store.load_projects(Project, "random", legacy_owner="admin") == []
+    assert [project.name for project in store.load_projects(Project, "admin", legacy_owner="admin")] == ["Old"]
+    assert store.load_projects(Project, "random", legacy_owner="random") == []